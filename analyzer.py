@@ -0,0 +1,143 @@
+import re
+from collections import defaultdict
+from functools import lru_cache
+from urllib.parse import urljoin
+
+# XPath's normalize-space() only treats these characters as whitespace
+XPATH_WHITESPACE = re.compile(r'[ \t\r\n]+')
+
+CLASS_TEST = "[@class and contains(concat(' ', normalize-space(@class), ' '), {})]"
+
+
+@lru_cache(maxsize=1)
+def _translator():
+    # cssselect is only needed once a page is analyzed
+    from cssselect import GenericTranslator
+    return GenericTranslator()
+
+
+def _expected_xpath(kind: str, tag: str, value: str | None) -> str:
+    """XPath cssselect produces for a plain tag/class/id selector."""
+    if kind == 'tag':
+        return f"descendant-or-self::{tag}"
+    literal = _translator().xpath_literal(value)
+    if kind == 'class':
+        return f"descendant-or-self::{tag}" + CLASS_TEST.format(
+            _translator().xpath_literal(f" {value} "))
+    if kind == 'id':
+        return f"descendant-or-self::*[@id = {literal}]"
+    return f"descendant-or-self::{tag}[@id = {literal}]"
+
+
+def _element_text(el) -> str:
+    return ' '.join(el.text_content().split()).strip()
+
+
+def _element_href(el) -> str | None:
+    if el.tag == 'a':
+        return el.get('href')
+    if el.getparent() is not None and el.getparent().tag == 'a':
+        return el.getparent().get('href')
+    a_tag = el.find('.//a')
+    if a_tag is not None:
+        return a_tag.get('href')
+    return None
+
+
+def analyze_page_structure(tree, base_url: str | None = None) -> list[dict]:
+    """Analyze page structure and return all potential selectors.
+
+    Walks the DOM once, grouping every element under the ``tag``,
+    ``tag.class``, ``#id`` and ``tag#id`` selectors it would match and
+    computing its normalized text and nearest link a single time. Only
+    selectors whose CSS does not translate to the plain XPath we grouped
+    by (odd class names, ids with spaces, ...) are evaluated against the
+    tree, so the output matches running each selector separately.
+
+    Sample links are resolved against ``base_url`` when one is given, so
+    the caller doesn't have to rewrite every link in the document.
+    """
+    translator = _translator()
+    candidates = {}  # selector -> (kind, tag, value)
+    groups = defaultdict(list)
+
+    for element in tree.iter():
+        if not isinstance(element.tag, str):
+            continue  # Comments and processing instructions
+        tag = element.tag
+        candidates[tag] = ('tag', tag, None)
+        groups[('tag', tag, None)].append(element)
+
+        cls = element.get('class')
+        if cls:
+            for name in cls.split():
+                candidates[f"{tag}.{name}"] = ('class', tag, name)
+            # Membership follows XPath whitespace rules, not str.split()
+            for name in set(XPATH_WHITESPACE.split(cls.strip(' \t\r\n'))):
+                groups[('class', tag, name)].append(element)
+
+        element_id = element.get('id')
+        if element_id:
+            candidates[f"#{element_id}"] = ('id', None, element_id)
+            candidates[f"{tag}#{element_id}"] = ('tag_id', tag, element_id)
+            groups[('id', None, element_id)].append(element)
+            groups[('tag_id', tag, element_id)].append(element)
+
+    texts = {}
+    hrefs = {}
+
+    def text_of(el):
+        if el not in texts:
+            texts[el] = _element_text(el)
+        return texts[el]
+
+    def href_of(el):
+        if el not in hrefs:
+            href = _element_href(el)
+            if href is not None and base_url:
+                href = urljoin(base_url, href.strip())
+            hrefs[el] = href
+        return hrefs[el]
+
+    selector_data = []
+    for selector in sorted(candidates):
+        try:
+            xpath = translator.css_to_xpath(selector)
+            key = candidates[selector]
+            if xpath == _expected_xpath(*key):
+                matching_elements = groups.get(key, [])
+            else:
+                matching_elements = tree.xpath(xpath)
+
+            content_elements = []
+            seen_texts = set()
+
+            for el in matching_elements:
+                text = text_of(el)
+
+                if text and text not in seen_texts and not text.startswith('var '):  # Skip script content
+                    content_elements.append({
+                        'text': text,
+                        'href': href_of(el)
+                    })
+                    seen_texts.add(text)
+
+            # Only add selectors that have 3 or more unique text contents
+            if len(content_elements) >= 3:
+                content_samples = []
+                for el in content_elements[:3]:
+                    sample_html = el['text'][:100]
+                    if el['href']:
+                        sample_html = f'<a href="{el["href"]}">{sample_html}</a>'
+                    content_samples.append(sample_html)
+
+                selector_data.append({
+                    'css': selector,
+                    'xpath': xpath,
+                    'example': len(content_elements),
+                    'samples': content_samples
+                })
+        except Exception:
+            continue
+
+    return selector_data
@@ -1,29 +1,41 @@
-from flask import Flask, render_template, request, jsonify
-from lxml import html, etree
-from cssselect import GenericTranslator
-import feedgenerator
-from datetime import datetime
+from flask import Flask, render_template, request, jsonify, Response, url_for, stream_with_context
+from lxml import html
+from datetime import datetime, timezone
 import requests
-from supabase import create_client
 import os
 from dotenv import load_dotenv
 from urllib.parse import urlparse
 from utils import (  # Add these imports
     validate_xpath_selector,
-    create_rss_feed
+    create_rss_feeds,
+    create_paginated_feed,
+    pagination_error,
+    is_feed_error,
+    document_base_url,
+    MAX_PAGE_BYTES
 )
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.common.exceptions import WebDriverException
-import time
+from analyzer import analyze_page_structure
 import urllib3
-import random
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-import ftfy
-from forms import FeedbackForm
+from browser_pool import browser_pool, render_page, BrowserError
+from fetcher import fetch, read_body
+from cache import get_cache, make_key
+from jobs import JobQueue, JobCancelled, QueueFull, FINISHED
+from metrics import metrics
+from profiler import SamplingProfiler
+from feed_cache import render_entry, choose_encoding, FEED_MAX_AGE
+from storage import BUCKET, RSS_CONTENT_TYPE, FeedWriter, filename_from_url
+from serializer import CONTENT_TYPES, count_items
+from supabase_client import get_supabase
+from textfix import fix_texts
+from host_health import host_health, HostUnavailable, NEEDS_SELENIUM, BLOCKED
+from refresh import HostThrottle, group_by_source, interleave_by_host
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from catalog import PAGINATION_COLUMN
+import hmac
 import secrets
+import threading
+import uuid
+import json
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 load_dotenv()
@@ -31,164 +43,410 @@ load_dotenv()
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', secrets.token_hex(32))
 
-# Initialize Supabase client with service role key
-supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
+# Optionally pre-launch the Selenium browsers in the background
+if os.getenv("BROWSER_POOL_WARM", "").lower() in ('1', 'true', 'yes'):
+    threading.Thread(target=browser_pool.warm, daemon=True).start()
 
-if not supabase_url or not supabase_key:
-    raise ValueError("Missing required environment variables SUPABASE_URL and/or SUPABASE_SERVICE_KEY")
+# Background executor for slow page analysis
+job_queue = JobQueue()
 
-supabase = create_client(
-    supabase_url,
-    supabase_key
-)
+# Shared secret the worker sends to /feeds/invalidate (endpoint off when unset)
+FEED_INVALIDATE_TOKEN = os.getenv("FEED_INVALIDATE_TOKEN")
+
+# Sampling profiler for single requests (?profile=1 or X-Profile header)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "").lower() in ('1', 'true', 'yes')
+
+# Limits of /feeds/bulk: feeds per request, pages fetched at once, and
+# at once from a single host
+BULK_MAX_FEEDS = int(os.getenv("BULK_MAX_FEEDS", 500))
+BULK_MAX_WORKERS = int(os.getenv("BULK_MAX_WORKERS", 8))
+BULK_PER_HOST_LIMIT = int(os.getenv("BULK_PER_HOST_LIMIT", 2))
 
-# Generate a secure random key
-print("Generated Secret Key:", secrets.token_hex(32))
+# Cache hit/miss counts per namespace, read at scrape time
+metrics.register_collector(lambda: [
+    (f"cache_{field}", {'namespace': namespace}, value)
+    for namespace, counts in get_cache().stats().items()
+    for field, value in counts.items()
+])
 
 # ---- Helper Functions ----
 
-def analyze_page_structure(tree) -> list[dict]:
-    """Analyze page structure and return all potential selectors."""
-    selectors = set()
-    translator = GenericTranslator()
-    selector_data = []
+def get_page_content(url, use_selenium=False):
+    """Fetch page content using enhanced techniques from old.py
+
+    A failed regular request raises; find_selectors decides whether to
+    retry with Selenium and what that says about the host. Hosts that
+    are down or blocking us raise HostUnavailable without a request.
+    """
+    if not use_selenium:
+        # Shared pooled session with retries and timeouts
+        with metrics.span('fetch', path='regular'):
+            response = fetch(url, verify=False, stream=True)  # Similar to old.py
+            response.raise_for_status()
+            return read_body(response, MAX_PAGE_BYTES)
     
-    # Find all elements
-    for element in tree.xpath('//*'):
-        # Get element with classes
-        if element.get('class'):
-            for cls in element.get('class').split():
-                selectors.add(f"{element.tag}.{cls}")
-        
-        # Get element with ID
-        if element.get('id'):
-            selectors.add(f"#{element.get('id')}")
-            selectors.add(f"{element.tag}#{element.get('id')}")
+    # Render with a pooled headless Chrome instead of launching a new one
+    try:
+        with metrics.span('selenium'), browser_pool.checkout() as driver:
+            # Light mode and the page budgets are the pool's (see browser_pool)
+            content = render_page(driver, url)
+        return content.encode('utf-8')
         
-        # Get element by tag
-        selectors.add(element.tag)
+    except BrowserError as e:
+        raise Exception(f"Selenium error: {str(e)}")
+
+def normalize_url(url):
+    """Add the https:// scheme /get_selectors assumes for bare hosts."""
+    if not url.startswith(('http://', 'https://')):
+        return 'https://' + url
+    return url
+
+def cached_rss_feed(url, title_xpath, description_xpath, pagination=None, format='rss'):
+    """create_rss_feed, reusing a recent result or the page /get_selectors fetched."""
+    return cached_rss_feeds(url, [{'url': url, 'title_xpath': title_xpath,
+                                   'description_xpath': description_xpath,
+                                   'pagination': pagination, 'format': format}])[0]
+
+def cached_rss_feeds(url, specs, throttle=None):
+    """cached_rss_feed for several selector pairs on one page, fetched at most once.
+
+    ``specs`` hold each feed's ``url`` (the same page as ``url``),
+    selectors and optional ``format``, as for utils.create_rss_feeds.
+    Specs with a ``pagination`` crawl their pages on their own, through
+    ``throttle`` if given (see utils.crawl_pages).
+    """
+    cache = get_cache()
+    keys = []
+    for spec in specs:
+        parts = [spec['url'], spec['title_xpath'], spec['description_xpath']]
+        if spec.get('pagination'):
+            parts.append(spec['pagination'])
+        if spec.get('format', 'rss') != 'rss':
+            parts.append(spec['format'])
+        keys.append(make_key(*parts))
+    results = [cache.get('rss', key) for key in keys]
+    missing = [index for index, rss_content in enumerate(results) if rss_content is None]
+    if not missing:
+        return results
+    
+    single = [index for index in missing if not specs[index].get('pagination')]
+    rendered = {}
+    if single:
+        content = cache.get('page', make_key(normalize_url(url)))
+        rendered.update(zip(single, create_rss_feeds(url, [specs[index] for index in single],
+                                                     content=content)))
+    for index in missing:
+        if index not in rendered:
+            spec = specs[index]
+            rendered[index] = create_paginated_feed(spec['url'], spec['title_xpath'],
+                                                    spec['description_xpath'], spec['pagination'],
+                                                    throttle=throttle,
+                                                    format=spec.get('format', 'rss'))
+    for index, rss_content in rendered.items():
+        results[index] = rss_content
+        if not is_feed_error(rss_content):
+            cache.set('rss', keys[index], rss_content)
+    return results
+
+def feed_spec_error(data):
+    """Why a feed spec (url, title_selector, description_selector, optional
+    pagination and format) is unusable, or None."""
+    if not isinstance(data, dict):
+        return 'Invalid JSON data'
+    url = data.get('url')
+    title_xpath = data.get('title_selector')
+    description_xpath = data.get('description_selector')
+    if not all([url, title_xpath, description_xpath]):
+        return 'Missing required fields'
+    for selector, name in [(title_xpath, 'title'), (description_xpath, 'description')]:
+        is_valid, error = validate_xpath_selector(selector)
+        if not is_valid:
+            return f'Invalid {name} XPath: {error}'
+    if data.get('format', 'rss') not in CONTENT_TYPES:
+        return f"Unknown format, expected one of: {', '.join(CONTENT_TYPES)}"
+    return feed_pagination_error(data.get('pagination'))
+
+def feed_pagination_error(pagination):
+    """Why an optional pagination spec can't be used, or None.
+
+    Specs are refused outright unless rss_feeds has the pagination
+    column (catalog.PAGINATION_COLUMN): a saved feed would otherwise
+    fail to insert, or be refreshed as a single page by the worker.
+    """
+    if pagination is None:
+        return None
+    if not PAGINATION_COLUMN:
+        return 'Pagination is not enabled on this server'
+    return pagination_error(pagination)
 
-    # Analyze each selector
-    for selector in sorted(selectors):
+def ensure_bucket(supabase):
+    """Create the feed storage bucket if it doesn't exist yet."""
+    try:
+        supabase.storage.get_bucket(BUCKET)
+    except:
+        supabase.storage.create_bucket(BUCKET)
+
+def bulk_feed_events(specs, save=False, include_content=False):
+    """Render (and with ``save`` store) many feeds; yields one result dict at a time.
+
+    Feeds reading the same page share one fetch. Pages are fetched on a
+    bounded pool, BULK_PER_HOST_LIMIT at a time per host, and every
+    feed's result is yielded as soon as its page is done: ``status`` is
+    'ok' or 'error'. With ``save`` the feeds are uploaded as they render
+    and their rss_feeds rows inserted in one request at the end, which
+    yields a 'saved' result per row. The last dict is the summary.
+    """
+    feeds = [
+        {'index': index, 'url': spec['url'], 'title_xpath': spec['title_selector'],
+         'description_xpath': spec['description_selector'], 'pagination': spec.get('pagination'),
+         'format': spec.get('format', 'rss')}
+        for index, spec in enumerate(specs)
+    ]
+    throttle = HostThrottle(BULK_PER_HOST_LIMIT, delay=0)
+    # Named like save_feed's files. Uploads overwrite (x-upsert), so a random
+    # part keeps feeds of one page, and requests in the same second, apart
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    writer = FeedWriter() if save else None
+    if writer is not None:
+        ensure_bucket(writer.client)
+    
+    def render_group(group):
+        with throttle.slot(group['url']):
+            try:
+                with metrics.span('bulk_render'):
+                    rendered = cached_rss_feeds(group['url'], group['feeds'], throttle)
+            except Exception as e:
+                rendered = [f"Error: {str(e)}"] * len(group['feeds'])
+        results = []
+        for feed, rss_content in zip(group['feeds'], rendered):
+            result = {'index': feed['index'], 'url': feed['url']}
+            if is_feed_error(rss_content):
+                results.append({**result, 'status': 'error', 'error': rss_content})
+                continue
+            result.update(status='ok', items=count_items(rss_content, feed['format']))
+            if include_content:
+                result['rss_content'] = rss_content.decode('utf-8')
+            if writer is not None:
+                try:
+                    with metrics.span('supabase_upload'):
+                        filename = f"{urlparse(feed['url']).netloc}_{timestamp}_{uuid.uuid4().hex}.xml"
+                        result['rss_url'] = writer.upload(filename, rss_content)
+                    feed['rss_content'] = rss_content
+                except Exception as e:
+                    result.update(status='error', error=f"Upload failed: {str(e)}")
+            results.append(result)
+        return results
+    
+    uploaded = []
+    counts = {'ok': 0, 'error': 0, 'saved': 0}
+    with ThreadPoolExecutor(max_workers=max(1, BULK_MAX_WORKERS)) as executor:
+        futures = [executor.submit(render_group, group)
+                   for group in interleave_by_host(group_by_source(feeds))]
+        for future in as_completed(futures):
+            for result in future.result():
+                counts[result['status']] += 1
+                if 'rss_url' in result:
+                    uploaded.append(result)
+                yield result
+    metrics.inc('bulk_feeds_total', counts['ok'], outcome='ok')
+    metrics.inc('bulk_feeds_total', counts['error'], outcome='error')
+    
+    if uploaded:
+        uploaded.sort(key=lambda result: result['index'])
+        rows = [
+            {'url': feeds[result['index']]['url'],
+             'title_xpath': feeds[result['index']]['title_xpath'],
+             'description_xpath': feeds[result['index']]['description_xpath'],
+             'rss_file_url': result['rss_url']}
+            for result in uploaded
+        ]
+        if any(feeds[result['index']]['pagination'] for result in uploaded):
+            # A batch insert needs the same columns in every row
+            for row, result in zip(rows, uploaded):
+                row['pagination'] = feeds[result['index']]['pagination']
+        try:
+            # One insert for the whole batch; rows come back in the same order
+            with metrics.span('supabase_insert'):
+                inserted = writer.client.table('rss_feeds').insert(rows).execute().data or []
+        except Exception as e:
+            inserted = []
+            yield {'status': 'error', 'error': f"Insert failed: {str(e)}"}
+        for result, row in zip(uploaded, inserted):
+            feed_id = row['id']
+            # Serve the new feed straight away without a storage download
+            get_cache().set('feed', make_key(str(feed_id)),
+                            render_entry(feeds[result['index']].pop('rss_content')))
+            counts['saved'] += 1
+            yield {'index': result['index'], 'url': result['url'], 'status': 'saved',
+                   'feed_id': feed_id, 'rss_url': result['rss_url'],
+                   'feed_url': url_for('serve_feed', feed_id=feed_id, _external=True)}
+    
+    yield {'status': 'done', 'total': len(feeds), **counts}
+
+def find_selectors(url, cancel_event=None):
+    """Fetch a page and analyze it for selectors.
+
+    Returns a ``(payload, status_code)`` pair. Runs inside the request
+    for /get_selectors and on the job queue for /jobs/selectors, where
+    ``cancel_event`` lets a cancelled job skip the Selenium fallback.
+    """
+    cache = get_cache()
+    page_key = make_key(url)
+    cached_selectors = cache.get('selectors', page_key)
+    if cached_selectors is not None:
+        return {'selectors': cached_selectors}, 200
+
+    print(f"Fetching selectors for URL: {url}")  # Debug log
+
+    # Try regular requests first, unless the host is known to need a browser.
+    # A browser is only remembered as needed when the plain request was
+    # refused or its HTML had nothing to offer, not after a transient error
+    denied = False
+    needs_browser = False
+    if host_health.verdict(url) == NEEDS_SELENIUM:
+        metrics.inc('selenium_fallbacks_total', reason='verdict')
+    else:
         try:
-            xpath = translator.css_to_xpath(selector)
-            matching_elements = tree.xpath(xpath)
+            content = get_page_content(url)
+            print(f"Content length: {len(content)}")  # Debug log
             
-            content_elements = []
-            seen_texts = set()
+            with metrics.span('parse'):
+                tree = html.fromstring(content)
             
-            for el in matching_elements:
-                text = ' '.join(el.text_content().split()).strip()
-                
-                if text and text not in seen_texts and not text.startswith('var '):  # Skip script content
-                    # Get the href attribute
-                    href = None
-                    if el.tag == 'a':
-                        href = el.get('href')
-                    elif el.getparent() is not None and el.getparent().tag == 'a':
-                        href = el.getparent().get('href')
-                    else:
-                        a_tag = el.find('.//a')
-                        if a_tag is not None:
-                            href = a_tag.get('href')
-                    
-                    content_elements.append({
-                        'text': text,
-                        'href': href
-                    })
-                    seen_texts.add(text)
+            # Only the sample links get resolved, not every link on the page
+            with metrics.span('analyze'):
+                selectors = analyze_page_structure(tree, document_base_url(tree, url))
+            print(f"Found {len(selectors)} selectors")  # Debug log
             
-            # Only add selectors that have 3 or more unique text contents
-            if len(content_elements) >= 3:
-                content_samples = []
-                for el in content_elements[:3]:
-                    sample_html = el['text'][:100]
-                    if el['href']:
-                        sample_html = f'<a href="{el["href"]}">{sample_html}</a>'
-                    content_samples.append(sample_html)
+            if selectors:
+                # Sort selectors by example count in descending order
+                selectors.sort(key=lambda x: x['example'], reverse=True)
                 
-                selector_data.append({
-                    'css': selector,
-                    'xpath': xpath,
-                    'example': len(content_elements),
-                    'samples': content_samples
-                })
-        except:
-            continue
-            
-    return selector_data
-
-def get_page_content(url, use_selenium=False):
-    """Fetch page content using enhanced techniques from old.py"""
-    if not use_selenium:
-        # Initialize session with retry mechanism
-        session = requests.Session()
-        retries = urllib3.util.Retry(
-            total=3,
-            backoff_factor=1,
-            status_forcelist=[500, 502, 503, 504]
-        )
-        session.mount('https://', requests.adapters.HTTPAdapter(max_retries=retries))
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Cache-Control': 'max-age=0'
-        }
-        
-        try:
-            response = session.get(
-                url,
-                headers=headers,
-                verify=False,  # Similar to old.py
-                timeout=(10, 30),  # Connection timeout, Read timeout
-                allow_redirects=True
-            )
-            response.raise_for_status()
-            return response.content
+                # Fix encoding in selector samples
+                with metrics.span('ftfy'):
+                    for selector in selectors:
+                        selector['samples'] = fix_texts(selector['samples'])
+                
+                cache.set('page', page_key, content)
+                cache.set('selectors', page_key, selectors)
+                return {'selectors': selectors}, 200
+            else:
+                print("No selectors found with regular request, trying Selenium...")
+                metrics.inc('selenium_fallbacks_total', reason='no_selectors')
+                needs_browser = True
             
-        except requests.RequestException as e:
+        except HostUnavailable as e:
+            print(f"Skipping unavailable host: {str(e)}")
+            return {
+                'error': 'Website is unavailable',
+                'details': [
+                    'The website failed repeatedly or is blocking automated access',
+                    'Try again later',
+                    f'Technical details: {str(e)}'
+                ]
+            }, 503
+        except Exception as e:
             print(f"Regular request failed: {str(e)}")
-            # If regular request fails, try with Selenium
-            return get_page_content(url, use_selenium=True)
-    
-    # Enhanced Selenium configuration from old.py
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--disable-dev-shm-usage')
-    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-    chrome_options.add_argument('--disable-extensions')
-    chrome_options.add_experimental_option('excludeSwitches', ['enable-automation'])
-    chrome_options.add_experimental_option('useAutomationExtension', False)
-    
+            metrics.inc('selenium_fallbacks_total', reason='request_failed')
+            denied = isinstance(e, requests.HTTPError) and e.response.status_code in (401, 403)
+            needs_browser = denied
+
+    if cancel_event is not None and cancel_event.is_set():
+        raise JobCancelled()
+
+    # If regular request fails or finds no selectors, try with Selenium
     try:
-        driver = webdriver.Chrome(options=chrome_options)
-        driver.get(url)
+        content = get_page_content(url, use_selenium=True)
+        print(f"Selenium content length: {len(content)}")  # Debug log
         
-        # Add random delay and scrolling like in old.py
-        total_height = int(driver.execute_script("return document.body.scrollHeight"))
-        for i in range(3):
-            scroll_height = random.randint(100, total_height)
-            driver.execute_script(f"window.scrollTo(0, {scroll_height});")
-            time.sleep(random.uniform(0.5, 2))
+        with metrics.span('parse'):
+            tree = html.fromstring(content)
         
-        # Wait for dynamic content
-        time.sleep(random.uniform(3, 5))
+        with metrics.span('analyze'):
+            selectors = analyze_page_structure(tree, document_base_url(tree, url))
+        print(f"Found {len(selectors)} selectors with Selenium")  # Debug log
         
-        content = driver.page_source
-        driver.quit()
-        return content.encode('utf-8')
+        if not selectors:
+            return {
+                'error': 'No suitable selectors found',
+                'details': [
+                    'Website blocking automated access',
+                    'Content protected behind authentication',
+                    'Complex website structure',
+                    'Try manually inspecting the page and entering XPath selectors'
+                ]
+            }, 404
+            
+        # Fix encoding in selector samples
+        with metrics.span('ftfy'):
+            for selector in selectors:
+                selector['samples'] = fix_texts(selector['samples'])
+            
+        cache.set('page', page_key, content)
+        cache.set('selectors', page_key, selectors)
+        if needs_browser:
+            # Next time skip straight to the browser for this host
+            host_health.set_verdict(url, NEEDS_SELENIUM)
+        return {'selectors': selectors}, 200
         
-    except WebDriverException as e:
-        if 'driver' in locals():
-            driver.quit()
-        raise Exception(f"Selenium error: {str(e)}")
+    except Exception as e:
+        print(f"Selenium request failed: {str(e)}")  # Debug log
+        if denied:
+            host_health.set_verdict(url, BLOCKED)
+        return {
+            'error': 'Failed to access the website',
+            'details': [
+                'Website may be blocking automated access',
+                'Try manually inspecting the page and entering XPath selectors',
+                f'Technical details: {str(e)}'
+            ]
+        }, 400
+
+def load_rendered_feed(feed_id):
+    """Cached render entry of a stored feed, loading it from storage on a miss.
+
+    Returns None when there is no stored feed for ``feed_id``; that answer
+    is cached briefly too.
+    """
+    cache = get_cache()
+    key = make_key(str(feed_id))
+    entry = cache.get('feed', key)
+    if entry is not None:
+        return entry
+    if cache.get('feed_missing', key):
+        return None
+
+    supabase = get_supabase()
+    rows = supabase.table('rss_feeds').select('id, rss_file_url').eq('id', feed_id).execute().data
+    filename = filename_from_url(rows[0].get('rss_file_url'), BUCKET) if rows else None
+    if filename is None:
+        cache.set('feed_missing', key, True)
+        return None
+    with metrics.span('supabase_download'):
+        body = supabase.storage.from_(BUCKET).download(filename)
+    entry = render_entry(body)
+    cache.set('feed', key, entry)
+    return entry
+
+def run_selector_job(url, cancel_event):
+    """Job-queue wrapper around find_selectors keeping its status code."""
+    payload, status = find_selectors(url, cancel_event)
+    return {'status_code': status, **payload}
+
+# ---- Profiling ----
+
+@app.before_request
+def start_profiler():
+    if PROFILING_ENABLED and (request.args.get('profile') or request.headers.get('X-Profile')):
+        request.environ['profiler'] = SamplingProfiler().start()
+
+@app.after_request
+def stop_profiler(response):
+    profiler = request.environ.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        response.headers['X-Profile-File'] = profiler.save(request.endpoint or 'request')
+    return response
 
 # ---- Routes ----
 
@@ -203,29 +461,23 @@ def generate_rss():
         if not data:
             return jsonify({'error': 'Invalid JSON data'}), 400
             
-        # Extract and validate required fields
-        url = data.get('url')
-        title_xpath = data.get('title_selector')
-        description_xpath = data.get('description_selector')
-        
-        if not all([url, title_xpath, description_xpath]):
-            return jsonify({
-                'error': 'Missing required fields'
-            }), 400
-            
-        # Validate XPath selectors
-        for selector, name in [(title_xpath, 'title'), (description_xpath, 'description')]:
-            is_valid, error = validate_xpath_selector(selector)
-            if not is_valid:
-                return jsonify({'error': f'Invalid {name} XPath: {error}'}), 400
+        error = feed_spec_error(data)
+        if error:
+            return jsonify({'error': error}), 400
+        url = data['url']
+        title_xpath = data['title_selector']
+        description_xpath = data['description_selector']
         
-        # Generate RSS feed
-        rss_content = create_rss_feed(url, title_xpath, description_xpath)
+        # Generate RSS feed (or an Atom or JSON Feed preview)
+        feed_format = data.get('format', 'rss')
+        rss_content = cached_rss_feed(url, title_xpath, description_xpath, data.get('pagination'),
+                                      feed_format)
         
-        if rss_content.startswith('Error'):
+        if is_feed_error(rss_content):
             return jsonify({'error': rss_content}), 400
             
-        return jsonify({'rss_content': rss_content})
+        return jsonify({'rss_content': rss_content.decode('utf-8'),
+                        'content_type': CONTENT_TYPES[feed_format]})
         
     except Exception as e:
         return jsonify({'error': f'Server error: {str(e)}'}), 500
@@ -238,80 +490,65 @@ def fetch_selectors():
             return jsonify({'error': 'URL is required'}), 400
 
         # Add URL validation
-        if not url.startswith(('http://', 'https://')):
-            url = 'https://' + url
+        url = normalize_url(url)
 
-        print(f"Fetching selectors for URL: {url}")  # Debug log
-
-        # Try regular requests first
-        try:
-            content = get_page_content(url, use_selenium=False)
-            print(f"Content length: {len(content)}")  # Debug log
-            
-            tree = html.fromstring(content)
-            tree.make_links_absolute(url)  # Make all links absolute
-            
-            selectors = analyze_page_structure(tree)
-            print(f"Found {len(selectors)} selectors")  # Debug log
-            
-            if selectors:
-                # Sort selectors by example count in descending order
-                selectors.sort(key=lambda x: x['example'], reverse=True)
-                
-                # Fix encoding in selector samples
-                for selector in selectors:
-                    selector['samples'] = [ftfy.fix_text(sample) for sample in selector['samples']]
-                
-                return jsonify({'selectors': selectors})
-            else:
-                print("No selectors found with regular request, trying Selenium...")
-                
-        except Exception as e:
-            print(f"Regular request failed: {str(e)}")
-
-        # If regular request fails or finds no selectors, try with Selenium
-        try:
-            content = get_page_content(url, use_selenium=True)
-            print(f"Selenium content length: {len(content)}")  # Debug log
-            
-            tree = html.fromstring(content)
-            tree.make_links_absolute(url)
-            
-            selectors = analyze_page_structure(tree)
-            print(f"Found {len(selectors)} selectors with Selenium")  # Debug log
-            
-            if not selectors:
-                return jsonify({
-                    'error': 'No suitable selectors found',
-                    'details': [
-                        'Website blocking automated access',
-                        'Content protected behind authentication',
-                        'Complex website structure',
-                        'Try manually inspecting the page and entering XPath selectors'
-                    ]
-                }), 404
-                
-            # Fix encoding in selector samples
-            for selector in selectors:
-                selector['samples'] = [ftfy.fix_text(sample) for sample in selector['samples']]
-                
-            return jsonify({'selectors': selectors})
-            
-        except Exception as e:
-            print(f"Selenium request failed: {str(e)}")  # Debug log
-            return jsonify({
-                'error': 'Failed to access the website',
-                'details': [
-                    'Website may be blocking automated access',
-                    'Try manually inspecting the page and entering XPath selectors',
-                    f'Technical details: {str(e)}'
-                ]
-            }), 400
+        payload, status = find_selectors(url)
+        return jsonify(payload), status
 
     except Exception as e:
         print(f"Server error: {str(e)}")  # Debug log
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+@app.route('/jobs/selectors', methods=['POST'])
+def submit_selector_job():
+    data = request.get_json(silent=True) or {}
+    url = data.get('url')
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+
+    url = normalize_url(url)
+    try:
+        # Identical URLs already being analyzed share one job
+        job = job_queue.submit(f"selectors:{url}", run_selector_job, url)
+    except QueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify(job.to_dict()), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def stream():
+        status = None
+        while True:
+            new_status = job_queue.wait_for_change(job, status, timeout=15)
+            if new_status == status:
+                yield ": keep-alive\n\n"
+                continue
+            status = new_status
+            yield f"event: status\ndata: {json.dumps(job.to_dict())}\n\n"
+            if status in FINISHED:
+                return
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/save_feed', methods=['POST'])
 def save_feed():
     try:
@@ -319,14 +556,18 @@ def save_feed():
         url = data.get('url')
         title_xpath = data.get('title_selector')
         description_xpath = data.get('description_selector')
+        pagination = data.get('pagination')
         
         if not all([url, title_xpath, description_xpath]):
             return jsonify({'error': 'Missing required fields'}), 400
+        pagination_problem = feed_pagination_error(pagination)
+        if pagination_problem:
+            return jsonify({'error': pagination_problem}), 400
             
-        # Generate RSS content
-        rss_content = create_rss_feed(url, title_xpath, description_xpath)
+        # Generate RSS content (usually cached by the preview just before)
+        rss_content = cached_rss_feed(url, title_xpath, description_xpath, pagination)
         
-        if rss_content.startswith('Error'):
+        if is_feed_error(rss_content):
             return jsonify({'error': rss_content}), 400
 
         # Create a unique filename using the domain and timestamp
@@ -334,19 +575,19 @@ def save_feed():
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f"{domain}_{timestamp}.xml"
         
+        supabase = get_supabase()
+        
         # Ensure the storage bucket exists
-        try:
-            supabase.storage.get_bucket('rss-feed-storage')
-        except:
-            supabase.storage.create_bucket('rss-feed-storage')
+        ensure_bucket(supabase)
         
-        # Convert string content to bytes
-        file_data = rss_content.encode('utf-8')
+        # The feed is rendered as bytes already
+        file_data = rss_content
         
         # Upload the RSS content to Supabase Storage
-        storage_response = supabase.storage \
-            .from_('rss-feed-storage') \
-            .upload(filename, file_data)
+        with metrics.span('supabase_upload'):
+            storage_response = supabase.storage \
+                .from_('rss-feed-storage') \
+                .upload(filename, file_data)
 
         # Get the public URL for the uploaded file
         file_url = supabase.storage \
@@ -354,24 +595,141 @@ def save_feed():
             .get_public_url(filename)
             
         # Save feed info to database with the storage URL
-        result = supabase.table('rss_feeds').insert({
+        row = {
             'url': url,
             'title_xpath': title_xpath,
             'description_xpath': description_xpath,
             'rss_file_url': file_url
-        }).execute()
+        }
+        if pagination:
+            row['pagination'] = pagination
+        result = supabase.table('rss_feeds').insert(row).execute()
         
-        return jsonify({
+        payload = {
             'message': 'Feed saved successfully',
             'data': result.data,
             'rss_url': file_url
-        })
+        }
+        if result.data:
+            # Serve the new feed straight away without a storage download
+            feed_id = result.data[0]['id']
+            get_cache().set('feed', make_key(str(feed_id)), render_entry(file_data))
+            payload['feed_url'] = url_for('serve_feed', feed_id=feed_id, _external=True)
+        return jsonify(payload)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/feeds/bulk', methods=['POST'])
+def bulk_feeds():
+    """Preview, and with ``"save": true`` create, many feeds in one request.
+
+    Takes ``{"feeds": [{url, title_selector, description_selector}, ...]}``,
+    each spec optionally with a ``pagination`` (see utils.pagination_error)
+    and a preview ``format`` (serializer.CONTENT_TYPES; saved feeds are
+    served and refreshed as RSS). Every spec is validated before any page
+    is fetched. Results come back
+    as NDJSON while they complete when the client accepts
+    application/x-ndjson, otherwise as one JSON document at the end.
+    """
+    data = request.get_json(silent=True) or {}
+    specs = data.get('feeds')
+    if not isinstance(specs, list) or not specs:
+        return jsonify({'error': 'A non-empty "feeds" list is required'}), 400
+    if len(specs) > BULK_MAX_FEEDS:
+        return jsonify({'error': f'At most {BULK_MAX_FEEDS} feeds per request'}), 413
+    
+    invalid = [
+        {'index': index, 'status': 'error', 'error': error}
+        for index, error in enumerate(map(feed_spec_error, specs)) if error
+    ]
+    if invalid:
+        return jsonify({'error': 'Invalid feed specs', 'results': invalid}), 400
+    if data.get('save') and any(spec.get('format', 'rss') != 'rss' for spec in specs):
+        return jsonify({'error': 'Only RSS feeds can be saved'}), 400
+    
+    events = bulk_feed_events(specs, save=bool(data.get('save')),
+                              include_content=bool(data.get('include_content')))
+    
+    streamed = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+    if streamed == 'application/x-ndjson':
+        def stream():
+            try:
+                for event in events:
+                    yield json.dumps(event) + '\n'
+            except Exception as e:
+                yield json.dumps({'status': 'error', 'error': f'Server error: {str(e)}'}) + '\n'
+        return Response(stream_with_context(stream()), mimetype='application/x-ndjson',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    
+    results = [None] * len(specs)
+    errors = []
+    summary = None
+    try:
+        for event in events:
+            if event['status'] == 'done':
+                summary = event
+            elif 'index' not in event:
+                errors.append(event['error'])
+            elif event['status'] == 'saved':
+                results[event['index']].update(event)
+            else:
+                results[event['index']] = event
+    except Exception as e:
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+    payload = {'results': results, 'summary': summary}
+    if errors:
+        payload['errors'] = errors
+    return jsonify(payload)
+
+# Feed ids are integers; anything else is a 404 without a database query
+@app.route('/feed/<int:feed_id>')
+def serve_feed(feed_id):
+    try:
+        entry = load_rendered_feed(feed_id)
+    except Exception as e:
+        return jsonify({'error': f'Could not load feed: {str(e)}'}), 502
+    if entry is None:
+        return jsonify({'error': 'Feed not found'}), 404
+
+    encoding = choose_encoding(entry, request.accept_encodings)
+    response = Response(entry['variants'][encoding], content_type=RSS_CONTENT_TYPE)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.set_etag(entry['etags'][encoding])
+    response.last_modified = datetime.fromtimestamp(entry['last_modified'], timezone.utc)
+    response.cache_control.public = True
+    response.cache_control.max_age = FEED_MAX_AGE
+    # Turns the response into a 304 when the client's copy is current
+    return response.make_conditional(request)
+
+@app.route('/feeds/invalidate', methods=['POST'])
+def invalidate_feeds():
+    """Drop cached renders of feeds the worker has just rewritten."""
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not FEED_INVALIDATE_TOKEN or not hmac.compare_digest(token, FEED_INVALIDATE_TOKEN):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    ids = (request.get_json(silent=True) or {}).get('ids') or []
+    cache = get_cache()
+    for feed_id in ids:
+        cache.delete('feed', make_key(str(feed_id)))
+        cache.delete('feed_missing', make_key(str(feed_id)))
+    return jsonify({'invalidated': len(ids)})
+
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify(get_cache().stats())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/feedback', methods=['GET', 'POST'])
 def feedback():
+    # wtforms is only needed by this page, so it is imported on first use
+    from forms import FeedbackForm
     form = FeedbackForm()
     if form.validate_on_submit():
         try:
@@ -383,7 +741,7 @@ def feedback():
                 'created_at': datetime.now().isoformat()
             }
             
-            result = supabase.table('user_feedback').insert(feedback_data).execute()
+            result = get_supabase().table('user_feedback').insert(feedback_data).execute()
             
             return jsonify({
                 'message': 'Thank you for your feedback!',
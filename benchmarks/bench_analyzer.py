@@ -0,0 +1,92 @@
+"""Compare the single-pass analyze_page_structure with the old per-selector one.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_analyzer
+"""
+import time
+
+from cssselect import GenericTranslator
+from lxml import html
+
+from analyzer import analyze_page_structure
+from benchmarks.fixtures import load_fixtures
+
+
+def legacy_analyze_page_structure(tree) -> list[dict]:
+    """The previous implementation: one full-document XPath per selector."""
+    selectors = set()
+    translator = GenericTranslator()
+    selector_data = []
+
+    for element in tree.xpath('//*'):
+        if element.get('class'):
+            for cls in element.get('class').split():
+                selectors.add(f"{element.tag}.{cls}")
+        if element.get('id'):
+            selectors.add(f"#{element.get('id')}")
+            selectors.add(f"{element.tag}#{element.get('id')}")
+        selectors.add(element.tag)
+
+    for selector in sorted(selectors):
+        try:
+            xpath = translator.css_to_xpath(selector)
+            content_elements = []
+            seen_texts = set()
+            for el in tree.xpath(xpath):
+                text = ' '.join(el.text_content().split()).strip()
+                if text and text not in seen_texts and not text.startswith('var '):
+                    href = None
+                    if el.tag == 'a':
+                        href = el.get('href')
+                    elif el.getparent() is not None and el.getparent().tag == 'a':
+                        href = el.getparent().get('href')
+                    else:
+                        a_tag = el.find('.//a')
+                        if a_tag is not None:
+                            href = a_tag.get('href')
+                    content_elements.append({'text': text, 'href': href})
+                    seen_texts.add(text)
+            if len(content_elements) >= 3:
+                content_samples = []
+                for el in content_elements[:3]:
+                    sample_html = el['text'][:100]
+                    if el['href']:
+                        sample_html = f'<a href="{el["href"]}">{sample_html}</a>'
+                    content_samples.append(sample_html)
+                selector_data.append({
+                    'css': selector,
+                    'xpath': xpath,
+                    'example': len(content_elements),
+                    'samples': content_samples
+                })
+        except Exception:
+            continue
+    return selector_data
+
+
+def best_of(func, tree, repeat: int) -> tuple[float, list]:
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(tree)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main(repeat: int = 3):
+    print(f"{'page':<28}{'bytes':>10}{'legacy s':>11}{'single s':>11}{'speedup':>9}")
+    for name, content in load_fixtures(synthetic_sizes=(50, 250, 1000)).items():
+        tree = html.fromstring(content)
+        tree.make_links_absolute('https://example.com/')
+        legacy_time, legacy = best_of(legacy_analyze_page_structure, tree, repeat)
+        new_time, new = best_of(analyze_page_structure, tree, repeat)
+        if legacy != new:
+            raise SystemExit(f"Output mismatch on {name}")
+        print(f"{name:<28}{len(content):>10}{legacy_time:>11.3f}{new_time:>11.3f}"
+              f"{legacy_time / new_time:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
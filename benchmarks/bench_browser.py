@@ -0,0 +1,203 @@
+"""Selenium fallback cost: full page loads against light mode.
+
+Run from the repository root (needs Chrome and chromedriver):
+
+    python -m benchmarks.bench_browser
+    python -m benchmarks.bench_browser --pages 10 --images 60
+
+Serves a local JavaScript-rendered news page dragging along the weight
+of a real one: large images, slow stylesheets and web fonts, a video
+and a slow third-party tracker that loads more images. Each mode renders
+it with browser_pool.render_page on its own pooled browser; the full
+mode without budgets behaves like the fallback before light mode. Both
+must find the same articles. Reports the median page time, the bytes
+transferred (browser_transferred_bytes_total, counted from DevTools
+network events, so the cross-origin tracker's bytes are included), the
+page's JS heap and the resident memory of the whole browser process
+tree (Linux only).
+"""
+import argparse
+import http.server
+import json
+import os
+import statistics
+import threading
+import time
+
+from benchmarks.fixtures import synthetic_page
+from browser_pool import BLOCKED_URL_PATTERNS, BrowserPool, block_resources, render_page
+from metrics import metrics
+
+ARTICLES = 50
+ASSET_DELAY = 0.05  # Seconds before every asset response
+SLOW_DELAY = 1.0  # Stylesheets, fonts and the tracker
+
+
+def heavy_site(images: int, tracker_port: int) -> dict[str, tuple[str, bytes, float]]:
+    """{path: (content type, body, delay)} of the page and its assets."""
+    articles = synthetic_page(ARTICLES).decode('utf-8')
+    main = articles[articles.index('<main'):articles.index('</main>') + len('</main>')]
+    tracker = f"http://tracker.localhost:{tracker_port}"
+    page = (
+        '<!DOCTYPE html><html><head><title>Heavy news</title>'
+        + ''.join(f'<link rel="stylesheet" href="/static/theme-{i}.css">' for i in range(3))
+        + f'<script async src="{tracker}/t.js"></script></head><body>'
+        '<video src="/media/intro.mp4" poster="/img/poster.jpg" autoplay muted></video>'
+        + ''.join(f'<img src="/img/photo-{i}.jpg" width="300">' for i in range(images))
+        + '<div id="app"></div><script>'
+        # Content arrives through JavaScript, the reason for using a browser
+        f'setTimeout(function () {{ document.getElementById("app").innerHTML = {json.dumps(main)}; }}, 200);'
+        '</script></body></html>'
+    ).encode('utf-8')
+    font_css = "@font-face { font-family: Body; src: url('/fonts/body.woff2'); } body { font-family: Body; }"
+    site = {
+        '/': ('text/html; charset=utf-8', page, 0.0),
+        '/media/intro.mp4': ('video/mp4', os.urandom(2 * 1024 * 1024), ASSET_DELAY),
+        '/img/poster.jpg': ('image/jpeg', os.urandom(300 * 1024), ASSET_DELAY),
+        '/fonts/body.woff2': ('font/woff2', os.urandom(200 * 1024), SLOW_DELAY),
+    }
+    for i in range(3):
+        site[f'/static/theme-{i}.css'] = ('text/css', font_css.encode('utf-8'), SLOW_DELAY)
+    for i in range(images):
+        site[f'/img/photo-{i}.jpg'] = ('image/jpeg', os.urandom(300 * 1024), ASSET_DELAY)
+    return site
+
+
+def tracker_site(origin: str) -> dict[str, tuple[str, bytes, float]]:
+    script = ''.join(
+        f'new Image().src = "{origin}/img/pixel-{i}.jpg?ts=" + Date.now();' for i in range(20)
+    )
+    return {'/t.js': ('application/javascript', script.encode('utf-8'), SLOW_DELAY)}
+
+
+class SiteServer:
+    """Serve {path: (content type, body, delay)} on a local port."""
+
+    def __init__(self, site: dict | None = None):
+        self.site = site or {}
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                entry = server.site.get(self.path.split('?', 1)[0])
+                if entry is None:
+                    self.send_error(404)
+                    return
+                content_type, body, delay = entry
+                time.sleep(delay)
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-store')
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Stopped or blocked loads hang up early
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.port = self.server.server_port
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def process_tree_rss(pid: int) -> int:
+    """Resident bytes of ``pid`` and all its descendants, from /proc (0 elsewhere)."""
+    children = {}
+    for entry in os.listdir('/proc') if os.path.isdir('/proc') else ():
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, ()))
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            pass
+    return total
+
+
+def transferred_total() -> float:
+    return sum(counter['value'] for counter in metrics.summary()['counters']
+               if counter['name'] == 'browser_transferred_bytes_total')
+
+
+def run_mode(name: str, pool: BrowserPool, url: str, pages: int, extra_patterns, **budgets) -> dict:
+    times, articles = [], set()
+    with pool.checkout() as driver:
+        if pool.light:
+            block_resources(driver, list(BLOCKED_URL_PATTERNS) + extra_patterns)
+        render_page(driver, url, **budgets)  # Warm-up: browser caches, JIT
+        for _ in range(pages):
+            driver.get('about:blank')
+            before = transferred_total()
+            started = time.perf_counter()
+            content = render_page(driver, url, **budgets)
+            times.append(time.perf_counter() - started)
+            articles.add(content.count('class="entry-title card-title"'))
+            transferred = transferred_total() - before
+            heap = driver.execute_script(
+                "return performance.memory ? performance.memory.usedJSHeapSize : 0;"
+            )
+        rss = process_tree_rss(driver.service.process.pid)
+    pool.shutdown()
+    return {'name': name, 'median': statistics.median(times), 'max': max(times),
+            'transferred': transferred, 'heap': heap, 'rss': rss, 'articles': articles}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=5, help="Timed renders per mode")
+    parser.add_argument('--images', type=int, default=40, help="300 KB images on the page")
+    args = parser.parse_args(argv)
+
+    tracker = SiteServer()
+    tracker.site.update(tracker_site(f"http://tracker.localhost:{tracker.port}"))
+    site = SiteServer(heavy_site(args.images, tracker.port))
+    # The tracker stands in for the third-party hosts BLOCKED_HOSTS lists
+    extra_patterns = [f"*://tracker.localhost:{tracker.port}/*"]
+    url = f"http://127.0.0.1:{site.port}/"
+    try:
+        results = [
+            run_mode('full', BrowserPool(size=1, light=False), url, args.pages, extra_patterns,
+                     budget=120, max_bytes=None),
+            run_mode('light', BrowserPool(size=1, light=True), url, args.pages, extra_patterns),
+        ]
+    finally:
+        site.close()
+        tracker.close()
+
+    print(f"{'mode':<8}{'median s':>10}{'max s':>8}{'transfer MB':>13}{'JS heap MB':>12}"
+          f"{'browser RSS MB':>16}{'articles':>10}")
+    for result in results:
+        print(f"{result['name']:<8}{result['median']:>10.2f}{result['max']:>8.2f}"
+              f"{result['transferred'] / 1e6:>13.1f}{result['heap'] / 1e6:>12.1f}"
+              f"{result['rss'] / 1e6:>16.0f}{','.join(map(str, sorted(result['articles']))):>10}")
+    full, light = results
+    assert full['articles'] == light['articles'] == {ARTICLES}, "Light mode lost articles"
+    print(f"\nLight mode: {full['median'] / light['median']:.1f}x faster, "
+          f"{full['transferred'] / max(1, light['transferred']):.0f}x fewer bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Reading the rss_feeds catalog: one select('*') against keyset pages.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_catalog
+    python -m benchmarks.bench_catalog --rows 100000 --page-size 1000 --work-ms 20
+
+Uses an in-memory stand-in for the PostgREST table API that answers the
+same query builder calls as the supabase client, encodes and decodes
+each response as JSON like the real client, and sleeps for a round trip
+plus the transfer time of the response. ``--work-ms`` is the time spent
+on every page of feeds after it arrives (scheduling and queueing the
+refreshes), so the streamed read can overlap it.
+"""
+import argparse
+import bisect
+import json
+import time
+import tracemalloc
+
+from catalog import iter_catalog, prefetch
+
+ROUND_TRIP = 0.02
+BANDWIDTH = 20e6  # Bytes per second
+
+
+def catalog_rows(count: int) -> list[dict]:
+    """Rows shaped like rss_feeds, with the columns the worker never reads."""
+    return [
+        {
+            'id': i,
+            'url': f"https://site{i % 5000}.example.com/news/section-{i}",
+            'title_xpath': "//article//h2[contains(@class, 'entry-title')]/a",
+            'description_xpath': "//article//div[contains(@class, 'entry-summary')]/p",
+            'rss_file_url': f"https://project.supabase.co/storage/v1/object/public/rss-feeds/feed_{i}.xml",
+            'created_at': '2024-01-01T00:00:00.000000+00:00',
+            'title': f"Section {i} of site {i % 5000}",
+            'sample_items': json.dumps([{'title': 'Sample item', 'link': '/x'}] * 5),
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    def __init__(self, table):
+        self.table = table
+        self.columns = None
+        self.after = None
+        self.count = None
+
+    def select(self, columns: str):
+        self.columns = None if columns == '*' else columns.split(',')
+        return self
+
+    def order(self, column: str):
+        assert column == 'id'
+        return self
+
+    def limit(self, count: int):
+        self.count = count
+        return self
+
+    def gt(self, column: str, value):
+        assert column == 'id'
+        self.after = value
+        return self
+
+    def execute(self) -> Response:
+        rows = self.table.rows
+        start = 0 if self.after is None else bisect.bisect_right(self.table.ids, self.after)
+        end = len(rows) if self.count is None else start + self.count
+        page = rows[start:end]
+        if self.columns:
+            page = [{column: row[column] for column in self.columns} for row in page]
+        body = json.dumps(page)
+        self.table.requests += 1
+        time.sleep(ROUND_TRIP + len(body) / BANDWIDTH)
+        return Response(json.loads(body))
+
+
+class FakeTable:
+    def __init__(self, rows: list[dict]):
+        self.rows = rows
+        self.ids = [row['id'] for row in rows]
+        self.requests = 0
+
+
+class FakeClient:
+    """Just enough of supabase.Client.table() for the catalog reads."""
+
+    def __init__(self, rows: list[dict]):
+        self.tables = {'rss_feeds': FakeTable(rows)}
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self.tables[name])
+
+
+def measure(pages, work: float) -> dict:
+    """Consume ``pages``, spending ``work`` seconds on each; time and trace memory."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    first = None
+    ids = []
+    for page in pages:
+        if first is None:
+            first = time.perf_counter() - started
+        ids.extend(row['id'] for row in page)
+        time.sleep(work)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'first': first or 0.0, 'elapsed': elapsed, 'peak': peak, 'ids': ids}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--work-ms', type=float, default=20.0,
+                        help="Time spent on every page of feeds after it arrives")
+    args = parser.parse_args(argv)
+
+    rows = catalog_rows(args.rows)
+    expected = [row['id'] for row in rows]
+    work = args.work_ms / 1000
+    page_work = work * args.rows / args.page_size
+
+    def select_all(client):
+        # The old worker: the whole table, then all the work at once
+        yield client.table('rss_feeds').select('*').execute().data
+
+    runs = {
+        "select('*')": (lambda client: select_all(client), page_work),
+        'keyset pages': (lambda client: iter_catalog(client, args.page_size), work),
+        'keyset + prefetch': (lambda client: prefetch(iter_catalog(client, args.page_size)), work),
+    }
+    print(f"{args.rows} rows, {args.page_size} per page, {args.work_ms:.0f} ms of work per page")
+    print(f"{'read':<20}{'requests':>9}{'first rows s':>14}{'total s':>9}{'peak MB':>9}")
+    for name, (read, work_per_batch) in runs.items():
+        client = FakeClient(rows)
+        result = measure(read(client), work_per_batch)
+        assert result['ids'] == expected, f"{name}: rows missing, repeated or out of order"
+        print(f"{name:<20}{client.tables['rss_feeds'].requests:>9}{result['first']:>14.2f}"
+              f"{result['elapsed']:>9.2f}{result['peak'] / 1e6:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Paginated feeds: following next links against template pages fetched concurrently.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_pagination
+    python -m benchmarks.bench_pagination --pages 10 --items 20 --delay-ms 200
+
+Serves a multi-page listing locally (``list``, ``list?page=2`` ...),
+each response delayed like a remote server, where every page links to
+the next and repeats an item of the page before it. Each mode crawls it
+with utils.crawl_pages and must find every item exactly once; under a
+refresh.HostThrottle slot the template pages may not exceed its per-host
+limit. A second crawl that already knows the items of page 3 must stop
+there. Refreshes through create_paginated_feed with the item history
+then read only the first page (one response delay): the second finds
+nothing changed, and a third, after a story was added, stops at the
+first page and keeps every older item.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.run import FixtureServer
+from feed_state import FeedState
+from host_health import host_health
+from refresh import HostThrottle
+from utils import crawl_pages, create_paginated_feed
+
+TITLE_XPATH = "//article/h2/a"
+DESCRIPTION_XPATH = "//article/p"
+NEXT_XPATH = "//a[@rel='next']"
+
+
+def listing(pages: int, items: int, fresh: int = 0) -> dict[str, bytes]:
+    """{path: page} of the listing; the last item of each page shows up again on the next.
+
+    ``fresh`` new stories top the first page.
+    """
+    site = {}
+    for page in range(1, pages + 1):
+        numbers = list(range((page - 1) * items, page * items))
+        if page > 1:
+            numbers.insert(0, numbers[0] - 1)
+        else:
+            numbers[:0] = range(pages * items + fresh - 1, pages * items - 1, -1)
+        articles = ''.join(
+            f'<article><h2><a href="/news/{number}">Story {number}</a></h2><p>Summary {number}</p></article>'
+            for number in numbers
+        )
+        next_link = f'<a rel="next" href="/list?page={page + 1}">Older</a>' if page < pages else ''
+        path = 'list' if page == 1 else f'list?page={page}'
+        site[path] = f'<html><body><main>{articles}</main>{next_link}</body></html>'.encode('utf-8')
+    return site
+
+
+def timed_crawl(url: str, pagination: dict, seen_links=None,
+                throttle=None) -> tuple[float, list[dict]]:
+    started = time.perf_counter()
+    items, _ = crawl_pages(url, TITLE_XPATH, DESCRIPTION_XPATH, pagination,
+                           max_items=None, seen_links=seen_links, throttle=throttle)
+    return time.perf_counter() - started, items
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=8)
+    parser.add_argument('--items', type=int, default=20, help="New items per page")
+    parser.add_argument('--delay-ms', type=float, default=200.0, help="Delay of every response")
+    args = parser.parse_args(argv)
+
+    host_health.rate = 0
+    total = args.pages * args.items
+    with FixtureServer(listing(args.pages, args.items), delay=args.delay_ms / 1000) as server:
+        url = server.url('list')
+        base = url.rsplit('/', 1)[0]
+        modes = {
+            'next links': {'next_xpath': NEXT_XPATH, 'max_pages': args.pages},
+            'url template': {'url_template': '?page={page}', 'max_pages': args.pages},
+        }
+        print(f"{args.pages} pages of {args.items} items, {args.delay_ms:.0f} ms per response")
+        print(f"{'mode':<16}{'seconds':>9}{'items':>7}")
+        for name, pagination in modes.items():
+            elapsed, items = timed_crawl(url, pagination)
+            links = [item['link'] for item in items]
+            assert len(links) == len(set(links)) == total, f"{name}: {len(links)} items, {total} expected"
+            print(f"{name:<16}{elapsed:>9.2f}{len(items):>7}")
+
+        # A worker holds one of the host's slots while it crawls
+        throttle = HostThrottle(per_host_limit=2, delay=0)
+        server.peak = 0
+        with throttle.slot(url):
+            elapsed, items = timed_crawl(url, modes['url template'], throttle=throttle)
+        assert len(items) == total, f"throttled: {len(items)} items, {total} expected"
+        assert server.peak <= 2, f"throttled: {server.peak} requests at once, the limit is 2"
+        print(f"{'throttled':<16}{elapsed:>9.2f}{len(items):>7}")
+
+        # Page 3 holds the first item an earlier refresh already stored
+        seen = {f"{base}/news/{number}" for number in range(2 * args.items, total)}
+        for name, pagination in modes.items():
+            _, items = timed_crawl(url, pagination, seen_links=seen)
+            assert len(items) == 3 * args.items, f"{name}: read past the first known item"
+
+        path = os.path.join(tempfile.mkdtemp(prefix='bench-pagination-'), 'feed_state.db')
+        state = FeedState(path)
+        fetch_meta = {}
+        pagination = modes['next links']
+        for run, fresh in enumerate((0, 0, 1)):
+            server.pages.update(listing(args.pages, args.items, fresh))
+            started = time.perf_counter()
+            feed = create_paginated_feed(
+                url, TITLE_XPATH, DESCRIPTION_XPATH, pagination, fetch_meta,
+                max_items=None, merge_items=lambda items: state.merge_items(1, items, total + 1),
+                seen_links=state.known_links(1)
+            )
+            elapsed = time.perf_counter() - started
+            expected = total + fresh
+            if run == 1:
+                assert feed is None, "An unchanged refresh reported a change"
+                expected = 0
+            else:
+                assert feed.count(b'<item>') == expected, f"Refresh {run + 1} lost items"
+            print(f"{'refresh ' + str(run + 1):<16}{elapsed:>9.2f}{expected:>7}")
+        state.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Feed serialization: feedgenerator against the streaming serializer.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_serializer
+    python -m benchmarks.bench_serializer --items 10 100 1000 10000
+
+For every feed size the old path (feedgenerator's writeString, then
+encoding the string for upload) is timed against serializer.render_feed
+writing RSS, Atom and JSON Feed bytes directly. The RSS and Atom output
+is checked to be identical to feedgenerator's. Peak memory is traced on
+a separate run.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import feedgenerator
+
+from serializer import render_feed
+
+REPEAT = 5
+CHANNEL = {
+    'title': 'Custom RSS - https://example.com/news',
+    'link': 'https://example.com/news',
+    'description': 'Custom RSS feed for https://example.com/news',
+    'language': 'en',
+}
+WORDS = ('council', 'budget', 'café', 'transport', 'festival', 'zürich', 'museum', 'tickets',
+         'report', '&', 'season', '“quoted”', 'minister', 'résumé', '<b>', 'reopens')
+
+
+def sample_items(count: int, seed: int = 0) -> list[dict]:
+    """Items shaped like the worker's: fixed text, absolute links, first-seen dates."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            'title': ' '.join(rng.choice(WORDS) for _ in range(8)).capitalize(),
+            'link': f"https://example.com/news/{i}-{rng.choice(WORDS)}?ref=home&page={i % 7}",
+            'description': ' '.join(rng.choice(WORDS) for _ in range(40)),
+            'guid': f"{rng.getrandbits(160):040x}",
+            'pubdate': start + timedelta(minutes=i),
+        }
+        for i in range(count)
+    ]
+
+
+def feedgenerator_feed(items: list[dict], feed_class=feedgenerator.Rss201rev2Feed) -> bytes:
+    """The previous utils.build_feed, plus the upload's encode."""
+    feed = feed_class(**CHANNEL)
+    for item in items:
+        feed.add_item(
+            title=item['title'],
+            link=item['link'],
+            description=item['description'],
+            pubdate=item['pubdate'],
+            unique_id=item['guid'],
+            unique_id_is_permalink=False
+        )
+    return feed.writeString('utf-8').encode('utf-8')
+
+
+def best_time(func, repeat: int = REPEAT) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def peak_memory(func) -> int:
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    args = parser.parse_args(argv)
+
+    print(f"{'items':>6}{'KB':>8}{'feedgen ms':>12}{'rss ms':>9}{'atom ms':>9}{'json ms':>9}"
+          f"{'speedup':>9}{'feedgen MB':>12}{'rss MB':>8}")
+    for count in args.items:
+        items = sample_items(count)
+        expected = feedgenerator_feed(items)
+        assert render_feed(CHANNEL, items) == expected, "RSS differs from feedgenerator"
+        assert (render_feed(CHANNEL, items, 'atom')
+                == feedgenerator_feed(items, feedgenerator.Atom1Feed)), "Atom differs from feedgenerator"
+
+        old = best_time(lambda: feedgenerator_feed(items), args.repeat)
+        rss = best_time(lambda: render_feed(CHANNEL, items), args.repeat)
+        atom = best_time(lambda: render_feed(CHANNEL, items, 'atom'), args.repeat)
+        json_feed = best_time(lambda: render_feed(CHANNEL, items, 'json'), args.repeat)
+        old_peak = peak_memory(lambda: feedgenerator_feed(items))
+        new_peak = peak_memory(lambda: render_feed(CHANNEL, items))
+
+        print(f"{count:>6}{len(expected) / 1024:>8.0f}{old * 1e3:>12.2f}{rss * 1e3:>9.2f}"
+              f"{atom * 1e3:>9.2f}{json_feed * 1e3:>9.2f}{old / rss:>8.1f}x"
+              f"{old_peak / 1e6:>12.2f}{new_peak / 1e6:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
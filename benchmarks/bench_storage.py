@@ -0,0 +1,187 @@
+"""Supabase round trips per refresh: the per-feed writes against FeedWriter.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_storage
+    python -m benchmarks.bench_storage --pages 20 --feeds-per-page 3
+
+Refreshes a catalog of feeds (several reading the same page with
+different selectors) with worker.refresh_feeds against pages served
+locally and an in-memory stand-in for the Supabase client that counts
+every request. Feeds reading the same page start out sharing one file,
+as rows written before files were per feed do: the first run uploads
+every feed over the file its row names, except that all but one of the
+feeds sharing a file move to files of their own. The second run finds
+every page unchanged. A feed deleted and
+a feed edited during the first run check that the end-of-run writes
+neither bring the row back nor undo the edit. The old update_feed
+(remove, upload, get_public_url and a row update for every feed) is
+replayed against the same stand-in for comparison.
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.fixtures import synthetic_page
+from benchmarks.run import SYNTHETIC_SELECTORS, FixtureServer
+from host_health import host_health
+
+SUPABASE_URL = 'https://project.supabase.co'
+# Extra selector pairs for the feeds that share a page
+TITLE_XPATHS = (
+    SYNTHETIC_SELECTORS['title_xpath'],
+    "//article//h2/a",
+    "//h2[contains(@class, 'card-title')]/a",
+)
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeBucket:
+    def __init__(self, client, name: str):
+        self.client = client
+        self.name = name
+
+    def upload(self, filename: str, data: bytes, options=None):
+        self.client.requests += 1
+        self.client.files[filename] = data
+
+    def remove(self, filenames: list):
+        self.client.requests += 1
+        for filename in filenames:
+            self.client.files.pop(filename, None)
+
+    def get_public_url(self, filename: str) -> str:
+        self.client.requests += 1
+        return f"{SUPABASE_URL}/storage/v1/object/public/{self.name}/{filename}?"
+
+
+class FakeStorage:
+    def __init__(self, client):
+        self.client = client
+
+    def from_(self, bucket: str) -> FakeBucket:
+        return FakeBucket(self.client, bucket)
+
+
+class FakeQuery:
+    def __init__(self, client):
+        self.client = client
+        self.values = None
+        self.id = None
+
+    def update(self, values: dict):
+        self.values = values
+        return self
+
+    def eq(self, column: str, value):
+        assert column == 'id'
+        self.id = value
+        return self
+
+    def execute(self) -> Response:
+        self.client.requests += 1
+        row = self.client.rows.get(self.id)
+        if row is None:
+            return Response([])  # An update never creates a row
+        row.update(self.values)
+        return Response([dict(row)])
+
+
+class FakeClient:
+    """Just enough of supabase.Client for the worker's writes, counting requests."""
+
+    def __init__(self, rows: list[dict]):
+        self.rows = {row['id']: dict(row) for row in rows}
+        self.files = {}
+        self.requests = 0
+        self.storage = FakeStorage(self)
+
+    def table(self, name: str) -> FakeQuery:
+        assert name == 'rss_feeds'
+        return FakeQuery(self)
+
+
+def catalog(server: FixtureServer, pages: int, feeds_per_page: int) -> list[dict]:
+    return [
+        {
+            'id': page * feeds_per_page + index + 1,
+            'url': server.url(f"page-{page}"),
+            'title_xpath': TITLE_XPATHS[index % len(TITLE_XPATHS)],
+            'description_xpath': SYNTHETIC_SELECTORS['description_xpath'],
+            'rss_file_url': f"{SUPABASE_URL}/storage/v1/object/public/rss-feed-storage/old_{page}.xml",
+        }
+        for page in range(pages)
+        for index in range(feeds_per_page)
+    ]
+
+
+def old_refresh(client: FakeClient, feeds: list[dict]) -> int:
+    """Requests the previous worker.update_feed made for ``feeds``."""
+    before = client.requests
+    for feed in feeds:
+        filename = f"feed_{feed['id']}.xml"
+        bucket = client.storage.from_('rss-feed-storage')
+        bucket.remove([filename])
+        bucket.upload(filename, b'<rss/>')
+        file_url = bucket.get_public_url(filename)
+        client.table('rss_feeds').update({'rss_file_url': file_url}).eq('id', feed['id']).execute()
+    return client.requests - before
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--feeds-per-page', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    state_dir = tempfile.mkdtemp(prefix='bench-storage-')
+    os.environ['FEED_STATE_PATH'] = os.path.join(state_dir, 'feed_state.db')
+    os.environ['WORKER_METRICS_PATH'] = os.path.join(state_dir, 'worker-metrics.json')
+    # Imported late: the worker opens its state store at import time
+    import worker
+    from storage import FeedWriter
+
+    host_health.rate = 0
+    pages = {f"page-{page}": synthetic_page(30, seed=page) for page in range(args.pages)}
+    with FixtureServer(pages) as server:
+        feeds = catalog(server, args.pages, args.feeds_per_page)
+        client = FakeClient(feeds)
+        worker.feed_writer = FeedWriter(client=client, supabase_url=SUPABASE_URL)
+        deleted, edited = feeds[0]['id'], feeds[1]['id']
+
+        publish = worker.publish_feed
+
+        def delete_and_edit_meanwhile(feed_data, *args):
+            client.rows.pop(deleted, None)
+            if feed_data['id'] == edited:
+                client.rows[edited]['title_xpath'] = '//h3/a'
+            return publish(feed_data, *args)
+
+        worker.publish_feed = delete_and_edit_meanwhile
+        runs = []
+        for _ in range(2):
+            worker.refresh_feeds([[dict(feed) for feed in feeds]], host_delay=0, force=True)
+            runs.append(worker.feed_writer.round_trips)
+        worker.publish_feed = publish
+
+    count = len(feeds)
+    assert len(client.files) == count, f"{count} feeds were written to {len(client.files)} files"
+    file_urls = [row['rss_file_url'] for row in client.rows.values()]
+    assert len(set(file_urls)) == len(file_urls), "Feeds still share a file"
+    assert deleted not in client.rows, "A feed deleted during the run was written back"
+    assert client.rows[edited]['title_xpath'] == '//h3/a', "An edit made during the run was undone"
+    assert runs[1] == 0, f"An unchanged run made {runs[1]} round trips"
+    old = old_refresh(FakeClient(feeds), feeds)
+
+    print(f"{count} feeds on {args.pages} pages")
+    print(f"{'run':<16}{'old round trips':>17}{'FeedWriter':>12}")
+    print(f"{'first':<16}{old:>17}{runs[0]:>12}")
+    print(f"{'unchanged':<16}{old:>17}{runs[1]:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Per-item cost of text fixing: plain ftfy.fix_text against textfix.fix_texts.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_textfix
+
+Uses the titles and descriptions extracted from every fixture page (save
+real pages with ``python -m benchmarks.run record``), plus a synthetic
+set mixing clean ASCII, accented text, curly quotes and mojibake. The
+cold run starts with an empty memo; the warm run repeats the same page,
+as the next refresh of an unchanged feed would.
+"""
+import random
+import time
+
+import ftfy
+from lxml import html
+
+import textfix
+from benchmarks.fixtures import load_fixtures
+from benchmarks.run import page_selectors
+from utils import compile_xpath, evaluate_descriptions, find_description
+
+REPEAT = 5
+MIXED_SAMPLES = (
+    "Council approves the new transport budget",
+    "Read more",
+    "Café owners say “business is back” after the festival",
+    "Zürich’s museum reopens — tickets from €12",
+    "The minister said itâ€™s â€œtoo earlyâ€ to decide",
+    "Tom &amp; Jerry return for a new season",
+    "Ünïcödé everywhere: naïve résumé façade",
+    "Posted by admin",
+)
+
+
+def page_strings(name: str, content: bytes) -> list[str]:
+    """Raw (unfixed) titles and descriptions of a page, as extract_items sees them."""
+    tree = html.fromstring(content)
+    selectors = page_selectors(name, tree)
+    titles = compile_xpath(selectors['title_xpath'])(tree)
+    descriptions = evaluate_descriptions(selectors['description_xpath'], tree)
+    return ([t.text_content().strip() for t in titles] +
+            [find_description(t, selectors['description_xpath'], tree, i, descriptions, fix=False)
+             for i, t in enumerate(titles)])
+
+
+def mixed_strings(count: int = 1000, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [f"{rng.choice(MIXED_SAMPLES)} {i % 50}" for i in range(count)]
+
+
+def best_time(func, repeat: int = REPEAT) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def cold_fix(strings: list[str]) -> list[str]:
+    textfix._cached_ftfy.cache_clear()
+    return textfix.fix_texts(strings)
+
+
+def main():
+    cases = {name: page_strings(name, content) for name, content in load_fixtures((50, 500)).items()}
+    cases['mixed-non-ascii'] = mixed_strings()
+
+    print(f"{'strings':<24}{'count':>7}{'clean':>7}{'ftfy µs':>10}{'cold µs':>10}"
+          f"{'warm µs':>10}{'speedup':>9}")
+    for name, strings in cases.items():
+        if not strings:
+            continue
+        expected = [ftfy.fix_text(s) for s in strings]
+        assert cold_fix(strings) == expected, f"{name}: output differs from ftfy"
+
+        baseline = best_time(lambda: [ftfy.fix_text(s) for s in strings])
+        cold = best_time(lambda: cold_fix(strings))
+        textfix.fix_texts(strings)
+        warm = best_time(lambda: textfix.fix_texts(strings))
+        clean = sum(not textfix.needs_fixing(s) for s in strings) / len(strings)
+
+        per_item = 1e6 / len(strings)
+        print(f"{name:<24}{len(strings):>7}{clean:>7.0%}{baseline * per_item:>10.1f}"
+              f"{cold * per_item:>10.1f}{warm * per_item:>10.1f}{baseline / warm:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import os
+import random
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+WORDS = (
+    "market report city council election weather storm update police school "
+    "energy price football season league science study health court ruling "
+    "budget minister transport strike festival museum climate economy"
+).split()
+
+
+def synthetic_page(items: int, seed: int = 0) -> bytes:
+    """Build a news-homepage-like listing with ``items`` articles.
+
+    Articles are wrapped in the nested, class-heavy markup typical of CMS
+    themes, with navigation, sidebars and inline scripts around them.
+    """
+    rng = random.Random(seed)
+
+    def sentence(n):
+        return ' '.join(rng.choice(WORDS) for _ in range(n)).capitalize()
+
+    parts = [
+        '<!DOCTYPE html><html><head><title>Synthetic news</title>',
+        '<script>var config = {"tracking": true};</script></head>',
+        '<body class="home page-template"><header id="masthead" class="site-header">',
+        '<nav class="main-nav"><ul class="menu">',
+    ]
+    for i in range(20):
+        parts.append(f'<li class="menu-item menu-item-{i}"><a href="/section/{i}">{sentence(2)}</a></li>')
+    parts.append('</ul></nav></header><main id="content" class="site-main"><div class="grid">')
+    for i in range(items):
+        parts.append(
+            f'<article id="post-{i}" class="post card type-post status-publish col-{i % 4}">'
+            f'<div class="card-inner"><h2 class="entry-title card-title">'
+            f'<a href="/news/{i}/{rng.choice(WORDS)}">{sentence(8)}</a></h2>'
+            f'<div class="entry-meta"><span class="byline">{sentence(2)}</span>'
+            f'<time class="published">2024-01-{i % 28 + 1:02d}</time></div>'
+            f'<div class="entry-summary"><p>{sentence(30)}</p></div>'
+            f'<footer class="entry-footer"><span class="cat-links">'
+            f'<a href="/tag/{rng.choice(WORDS)}" rel="tag">{rng.choice(WORDS)}</a></span>'
+            f'</footer></div></article>'
+        )
+    parts.append('</div></main><aside id="secondary" class="widget-area">')
+    for i in range(30):
+        parts.append(f'<section class="widget widget_{i % 5}"><h3 class="widget-title">{sentence(3)}</h3>'
+                     f'<p>{sentence(12)}</p></section>')
+    parts.append('</aside><footer id="colophon"><p class="copyright">Synthetic</p></footer></body></html>')
+    return ''.join(parts).encode('utf-8')
+
+
+def load_fixtures(synthetic_sizes=(50, 500, 2000)) -> dict[str, bytes]:
+    """Return saved HTML fixtures plus synthetic pages of the given sizes."""
+    fixtures = {}
+    if os.path.isdir(FIXTURES_DIR):
+        for name in sorted(os.listdir(FIXTURES_DIR)):
+            if name.endswith(('.html', '.htm')):
+                with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+                    fixtures[name] = f.read()
+    for size in synthetic_sizes:
+        fixtures[f'synthetic-{size}'] = synthetic_page(size)
+    return fixtures
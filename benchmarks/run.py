@@ -0,0 +1,303 @@
+"""Offline benchmarks for the fetch -> parse -> extract -> serialize pipeline.
+
+Run from the repository root:
+
+    python -m benchmarks.run                       # corpus + scaling runs
+    python -m benchmarks.run --output new.json --baseline old.json
+    python -m benchmarks.run record https://example.com/news --name example-news
+
+Pages come from benchmarks/fixtures/ (saved with ``record``) plus
+synthetic listings, and are served by a local HTTP server so no run
+touches the network. Each stage reports best-of-N wall time, the peak
+traced memory and the number of memory blocks it left allocated.
+"""
+import argparse
+import gc
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from lxml import html
+
+from analyzer import analyze_page_structure
+from benchmarks.fixtures import FIXTURES_DIR, load_fixtures, synthetic_page
+from fetcher import fetch, read_body
+from host_health import host_health
+from refresh import refresh_concurrently
+from utils import build_feed, create_rss_feed, evaluate_descriptions, extract_items, find_description, compile_xpath, is_feed_error
+
+# Selectors for the synthetic pages; saved pages use a <name>.json sidecar
+# ({"title_xpath": ..., "description_xpath": ...}) or the top analyzer hits
+SYNTHETIC_SELECTORS = {
+    'title_xpath': "//h2[contains(@class, 'entry-title')]/a",
+    'description_xpath': "//div[@class='entry-summary']/p",
+}
+SCALING_ITEMS = (100, 1000, 10000)
+SCALING_FEEDS = (1, 10, 100, 500)
+# Relative slowdown against the baseline that counts as a regression
+REGRESSION_THRESHOLD = 0.2
+
+
+def size_class(size: int) -> str:
+    if size < 100 * 1024:
+        return 'small'
+    if size < 1024 * 1024:
+        return 'medium'
+    return 'large'
+
+
+class FixtureServer:
+    """Serve an in-memory {path: bytes} mapping on a local port.
+
+    Paths may include a query string. Every response waits ``delay``
+    seconds first, like a distant server would. ``pages`` can be changed
+    while serving; ``peak`` is the most requests answered at once.
+    """
+
+    def __init__(self, pages: dict[str, bytes], delay: float = 0.0):
+        self.pages = pages = dict(pages)
+        self.peak = 0
+        active = []
+        lock = threading.Lock()
+        fixture = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                body = pages.get(self.path.lstrip('/'))
+                if body is None:
+                    self.send_error(404)
+                    return
+                with lock:
+                    active.append(self)
+                    fixture.peak = max(fixture.peak, len(active))
+                try:
+                    time.sleep(delay)
+                finally:
+                    with lock:
+                        active.remove(self)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Streaming readers may stop early
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def url(self, name: str) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/{name}"
+
+
+def measure(func, repeat: int = 3) -> tuple[dict, object]:
+    """Best-of-``repeat`` wall time plus memory figures of one traced run."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    traced_result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks_after = sys.getallocatedblocks()
+    del traced_result
+
+    return {
+        'seconds': best,
+        'peak_bytes': peak,
+        'allocated_blocks': blocks_after - blocks_before,
+    }, result
+
+
+def page_selectors(name: str, tree) -> dict:
+    """Title/description selectors to benchmark extraction on a page with."""
+    if name.startswith('synthetic-'):
+        return SYNTHETIC_SELECTORS
+    sidecar = os.path.join(FIXTURES_DIR, os.path.splitext(name)[0] + '.json')
+    if os.path.exists(sidecar):
+        with open(sidecar) as f:
+            return json.load(f)
+    found = sorted(analyze_page_structure(tree), key=lambda s: s['example'], reverse=True)
+    xpaths = [s['xpath'] for s in found[:2]] or ['//a', '//p']
+    return {'title_xpath': xpaths[0], 'description_xpath': xpaths[-1]}
+
+
+def bench_page(server: FixtureServer, name: str, content: bytes, repeat: int) -> dict:
+    url = server.url(name)
+    stages = {}
+
+    stages['fetch'], body = measure(lambda: read_body(fetch(url, stream=True)), repeat)
+    stages['parse'], tree = measure(lambda: html.fromstring(body), repeat)
+    stages['analyze'], _ = measure(lambda: analyze_page_structure(tree, url), repeat)
+
+    selectors = page_selectors(name, tree)
+    title_xpath = selectors['title_xpath']
+    description_xpath = selectors['description_xpath']
+
+    def describe():
+        titles = compile_xpath(title_xpath)(tree)
+        descriptions = evaluate_descriptions(description_xpath, tree)
+        return [find_description(t, description_xpath, tree, i, descriptions)
+                for i, t in enumerate(titles)]
+
+    stages['find_description'], _ = measure(describe, repeat)
+    stages['extract'], items = measure(
+        lambda: extract_items(tree, url, title_xpath, description_xpath), repeat)
+    stages['serialize'], _ = measure(lambda: build_feed(url, items), repeat)
+
+    return {
+        'bytes': len(content),
+        'size_class': size_class(len(content)),
+        'items': len(items),
+        'stages': stages,
+    }
+
+
+def bench_item_scaling(repeat: int) -> dict:
+    results = {}
+    for count in SCALING_ITEMS:
+        tree = html.fromstring(synthetic_page(count))
+        url = 'https://example.com/'
+        extract, items = measure(lambda: extract_items(
+            tree, url, SYNTHETIC_SELECTORS['title_xpath'], SYNTHETIC_SELECTORS['description_xpath']), repeat)
+        serialize, _ = measure(lambda: build_feed(url, items), repeat)
+        results[str(count)] = {'extract': extract, 'serialize': serialize}
+    return results
+
+
+def bench_feed_scaling(server: FixtureServer) -> dict:
+    results = {}
+    for count in SCALING_FEEDS:
+        feeds = [{'id': i, 'url': server.url('synthetic-50')} for i in range(count)]
+
+        def update(feed):
+            rss = create_rss_feed(feed['url'], SYNTHETIC_SELECTORS['title_xpath'],
+                                  SYNTHETIC_SELECTORS['description_xpath'])
+            return not is_feed_error(rss)
+
+        stats = refresh_concurrently(feeds, update, max_workers=min(count, 64),
+                                     per_host_limit=count, host_delay=0)
+        results[str(count)] = {key: stats[key] for key in (
+            'successful', 'elapsed', 'throughput', 'latency_p50', 'latency_p90', 'latency_p99')}
+    return results
+
+
+def compare(results: dict, baseline: dict) -> list[str]:
+    """List stages that got slower than the baseline by the threshold."""
+    regressions = []
+    for name, page in results.get('pages', {}).items():
+        base_page = baseline.get('pages', {}).get(name)
+        if not base_page:
+            continue
+        for stage, figures in page['stages'].items():
+            base = base_page['stages'].get(stage)
+            if not base or not base['seconds']:
+                continue
+            ratio = figures['seconds'] / base['seconds']
+            marker = ' REGRESSION' if ratio > 1 + REGRESSION_THRESHOLD else ''
+            print(f"  {name:<28}{stage:<18}{ratio:>6.2f}x{marker}")
+            if marker:
+                regressions.append(f"{name}/{stage}")
+    return regressions
+
+
+def print_pages(results: dict):
+    print(f"{'page':<28}{'class':<8}{'stage':<18}{'seconds':>10}{'peak KiB':>11}{'blocks':>9}")
+    for name, page in results.items():
+        for stage, figures in page['stages'].items():
+            print(f"{name:<28}{page['size_class']:<8}{stage:<18}{figures['seconds']:>10.4f}"
+                  f"{figures['peak_bytes'] / 1024:>11.0f}{figures['allocated_blocks']:>9}")
+
+
+def record(url: str, name: str | None):
+    """Save a live page into the fixtures directory."""
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    name = name or url.split('://', 1)[-1].strip('/').replace('/', '_')
+    path = os.path.join(FIXTURES_DIR, f"{name}.html")
+    response = fetch(url, stream=True)
+    response.raise_for_status()
+    with open(path, 'wb') as f:
+        f.write(read_body(response))
+    print(f"Saved {url} to {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', nargs='?', default='run', choices=['run', 'record'])
+    parser.add_argument('url', nargs='?', help="Page to save (record only)")
+    parser.add_argument('--name', help="Fixture name (record only)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="Write results as JSON to this file")
+    parser.add_argument('--baseline', help="Compare against a previous JSON result")
+    parser.add_argument('--skip-scaling', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        if not args.url:
+            parser.error("record needs a URL")
+        record(args.url, args.name)
+        return 0
+
+    # Every request goes to the one local server, which is not ours to protect
+    host_health.rate = 0
+
+    fixtures = load_fixtures()
+    results = {'created_at': time.time(), 'pages': {}}
+    with FixtureServer(fixtures) as server:
+        for name, content in fixtures.items():
+            results['pages'][name] = bench_page(server, name, content, args.repeat)
+        print_pages(results['pages'])
+
+        if not args.skip_scaling:
+            results['item_scaling'] = bench_item_scaling(args.repeat)
+            results['feed_scaling'] = bench_feed_scaling(server)
+            print("\nItems  extract s  serialize s")
+            for count, figures in results['item_scaling'].items():
+                print(f"{count:>5}  {figures['extract']['seconds']:>9.4f}  "
+                      f"{figures['serialize']['seconds']:>11.4f}")
+            print("\nFeeds  elapsed s  feeds/s    p50 s    p99 s")
+            for count, stats in results['feed_scaling'].items():
+                print(f"{count:>5}  {stats['elapsed']:>9.2f}  {stats['throughput']:>7.1f}  "
+                      f"{stats['latency_p50']:>7.3f}  {stats['latency_p99']:>7.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print("\nAgainst baseline (new / old):")
+        if compare(results, baseline):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""Cold-start import cost of the app and the worker.
+
+Run from the repository root:
+
+    python -m benchmarks.startup                   # app and worker
+    python -m benchmarks.startup app --top 30
+    python -m benchmarks.startup --budget-ms 400   # exit 1 when over budget
+
+Each module is imported in a fresh interpreter under ``-X importtime``.
+The report lists each module's direct imports by cumulative import time,
+and the best-of-N wall time of starting Python and importing it.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+MODULES = ('app', 'worker')
+# Cold-start budget per module in milliseconds (0 disables the check)
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", 0))
+
+# Importing doesn't contact Supabase any more, but keep the environment
+# complete so nothing fails on a missing variable
+DUMMY_ENV = {
+    'SUPABASE_URL': 'http://127.0.0.1:1',
+    'SUPABASE_SERVICE_KEY': 'startup-benchmark',
+    'FEED_STATE_PATH': os.path.join('.cache', 'startup-feed-state.db'),
+}
+
+
+def run_import(module: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    env = {**DUMMY_ENV, **os.environ}
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', f'import {module}']
+    result = subprocess.run(command, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    return result
+
+
+def import_costs(module: str) -> tuple[float, dict[str, float]]:
+    """Total import time of ``module`` and the cumulative time of each of its imports, in ms.
+
+    A module imported by several others is charged to whichever imported
+    it first, so the per-import figures add up to (roughly) the total.
+    """
+    total = 0.0
+    pending = {}
+    costs = {}
+    # -X importtime lists a module after everything it imported, indented
+    # by two spaces per nesting level
+    for line in run_import(module, importtime=True).stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        name = name.strip()
+        if depth == 1:
+            pending[name] = pending.get(name, 0.0) + int(cumulative) / 1000
+        elif depth == 0:
+            if name == module:
+                total = int(cumulative) / 1000
+                costs = pending
+            pending = {}
+    return total, costs
+
+
+def wall_time(module: str, repeat: int) -> float:
+    """Best-of-``repeat`` seconds for starting Python and importing ``module``."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run_import(module)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def report(module: str, top: int, repeat: int) -> float:
+    total, costs = import_costs(module)
+    print(f"\n{module}: {total:.1f} ms importing, "
+          f"{wall_time(module, repeat) * 1000:.1f} ms wall with interpreter start (best of {repeat})")
+    print(f"  {'import':<28}{'ms':>9}")
+    for name, cost in sorted(costs.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {name:<28}{cost:>9.1f}")
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modules', nargs='*', default=list(MODULES))
+    parser.add_argument('--top', type=int, default=15, help="Imports listed per module")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS,
+                        help="Fail when importing a module takes longer than this")
+    args = parser.parse_args(argv)
+
+    over_budget = []
+    for module in args.modules:
+        total = report(module, args.top, args.repeat)
+        if args.budget_ms and total > args.budget_ms:
+            over_budget.append(f"{module} ({total:.0f} ms > {args.budget_ms:.0f} ms)")
+
+    if over_budget:
+        print(f"\nOver the startup budget: {', '.join(over_budget)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
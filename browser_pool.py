@@ -0,0 +1,322 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import metrics
+
+# Selenium is imported where it is used, so processes that never render
+# a page (most web requests, the worker) don't pay for loading it
+
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", 2))
+MAX_PAGES_PER_BROWSER = int(os.getenv("BROWSER_MAX_PAGES", 50))
+CHECKOUT_TIMEOUT = float(os.getenv("BROWSER_CHECKOUT_TIMEOUT", 30))
+READY_TIMEOUT = float(os.getenv("BROWSER_READY_TIMEOUT", 10))
+# How long the DOM and network must stay quiet to count as settled
+SETTLE_TIME = float(os.getenv("BROWSER_SETTLE_TIME", 0.5))
+# Light mode renders only what feed extraction needs: no images, fonts,
+# stylesheets or media, no known ad and tracker hosts, and the DOM is
+# taken once the HTML is parsed rather than after every asset loaded
+LIGHT_MODE = os.getenv("BROWSER_LIGHT_MODE", "1").lower() in ('1', 'true', 'yes')
+# Hard limits per page: wall-clock seconds from navigation to DOM
+# snapshot, and bytes transferred before loading is stopped (0 disables)
+PAGE_BUDGET = float(os.getenv("BROWSER_PAGE_BUDGET", 15))
+PAGE_BYTE_BUDGET = int(os.getenv("BROWSER_PAGE_BYTE_BUDGET", 5 * 1024 * 1024)) or None
+
+# URL patterns (DevTools wildcards, matched against the whole URL) light
+# mode never loads. Requests are matched by URL because
+# Network.setBlockedURLs has no resource-type or same-site filter;
+# third-party scripts in general have to stay, since pages that need a
+# browser often render from CDN-hosted code.
+BLOCKED_EXTENSIONS = (
+    'png', 'jpg', 'jpeg', 'gif', 'webp', 'avif', 'svg', 'ico', 'bmp',
+    'woff', 'woff2', 'ttf', 'otf', 'eot', 'css',
+    'mp4', 'webm', 'mp3', 'm4a', 'ogg', 'wav', 'm3u8',
+)
+BLOCKED_HOSTS = (
+    'doubleclick.net', 'googlesyndication.com', 'googletagmanager.com',
+    'google-analytics.com', 'googleadservices.com', 'facebook.net',
+    'scorecardresearch.com', 'hotjar.com', 'amazon-adsystem.com', 'taboola.com',
+    'outbrain.com', 'criteo.com', 'criteo.net', 'adnxs.com', 'quantserve.com',
+    'chartbeat.com', 'chartbeat.net', 'nr-data.net',
+)
+BLOCKED_URL_PATTERNS = (
+    [pattern for extension in BLOCKED_EXTENSIONS
+     for pattern in (f"*.{extension}", f"*.{extension}?*")]
+    + [pattern for host in BLOCKED_HOSTS
+       for pattern in (f"*://{host}/*", f"*://*.{host}/*")]
+    + [pattern for pattern in os.getenv("BROWSER_BLOCKED_URLS", "").split(',') if pattern]
+)
+
+# Readiness probe: document state, resources requested so far and DOM size
+READY_PROBE = """
+return [document.readyState, performance.getEntriesByType('resource').length,
+        document.getElementsByTagName('*').length];
+"""
+
+
+class BrowserError(Exception):
+    """A browser failed to launch or render; wraps Selenium's WebDriverException."""
+
+
+class BrowserPoolTimeout(BrowserError):
+    """Raised when no browser becomes available within the checkout timeout."""
+
+
+def chrome_options(light: bool = LIGHT_MODE):
+    """Headless Chrome options used for every pooled browser."""
+    from selenium.webdriver.chrome.options import Options
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+    chrome_options.add_argument('--disable-extensions')
+    chrome_options.add_experimental_option('excludeSwitches', ['enable-automation'])
+    chrome_options.add_experimental_option('useAutomationExtension', False)
+    if light:
+        # Images are also blocked by the engine, which catches the ones
+        # whose URLs no pattern matches
+        chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+        chrome_options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2,
+        })
+        # driver.get() returns at DOMContentLoaded instead of the load event
+        chrome_options.page_load_strategy = 'eager'
+    # Network events feed transferred_bytes(); page and tracing events aren't needed
+    chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    chrome_options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+    return chrome_options
+
+
+def block_resources(driver, patterns=BLOCKED_URL_PATTERNS):
+    """Make the browser fail requests matching ``patterns`` (for the tab's lifetime)."""
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(patterns)})
+
+
+class PooledBrowser:
+    """A live Chrome instance and the number of pages it has served."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+
+class BrowserPool:
+    """Bounded pool of reusable headless Chrome instances.
+
+    At most ``size`` browsers exist at once. A browser is recycled after
+    ``max_pages`` pages or as soon as it raises a WebDriverException.
+    With ``light`` every browser runs in light mode (see LIGHT_MODE).
+    """
+
+    def __init__(self, size: int = POOL_SIZE, max_pages: int = MAX_PAGES_PER_BROWSER,
+                 light: bool = LIGHT_MODE):
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self.light = light
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _launch(self) -> PooledBrowser:
+        from selenium import webdriver
+        from selenium.common.exceptions import WebDriverException
+        try:
+            driver = webdriver.Chrome(options=chrome_options(self.light))
+        except WebDriverException as e:
+            raise BrowserError(str(e)) from e
+        browser = PooledBrowser(driver)
+        if self.light:
+            try:
+                block_resources(driver)
+            except WebDriverException as e:
+                browser.quit()
+                raise BrowserError(str(e)) from e
+        return browser
+
+    def warm(self, count: int | None = None):
+        """Pre-launch browsers so the first requests don't pay startup cost."""
+        for _ in range(min(count or self.size, self.size) - self._idle.qsize()):
+            if not self._slots.acquire(blocking=False):
+                break
+            try:
+                self._idle.put(self._launch())
+            except BrowserError as e:
+                print(f"Failed to pre-launch browser: {str(e)}")
+            finally:
+                self._slots.release()
+
+    @contextmanager
+    def checkout(self, timeout: float = CHECKOUT_TIMEOUT):
+        """Borrow a browser, waiting up to ``timeout`` seconds for a free one.
+
+        WebDriver errors raised while the browser is out come back as
+        BrowserError.
+        """
+        if not self._slots.acquire(timeout=timeout):
+            raise BrowserPoolTimeout(f"No browser available after {timeout}s")
+        try:
+            try:
+                browser = self._idle.get_nowait()
+            except queue.Empty:
+                browser = self._launch()
+
+            from selenium.common.exceptions import WebDriverException
+            try:
+                yield browser.driver
+            except WebDriverException as e:
+                browser.quit()  # Crashed or wedged, don't hand it out again
+                raise BrowserError(str(e)) from e
+            except Exception:
+                self._checkin(browser)
+                raise
+            else:
+                self._checkin(browser)
+        finally:
+            self._slots.release()
+
+    def _checkin(self, browser: PooledBrowser):
+        from selenium.common.exceptions import WebDriverException
+        browser.pages += 1
+        if self._closed or browser.pages >= self.max_pages:
+            browser.quit()
+            return
+        try:
+            # Drop per-site state before the next checkout
+            browser.driver.delete_all_cookies()
+            browser.driver.get('about:blank')
+        except WebDriverException:
+            browser.quit()
+            return
+        self._idle.put(browser)
+
+    def shutdown(self):
+        """Quit every idle browser and stop pooling returned ones."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().quit()
+            except queue.Empty:
+                break
+
+
+def stop_loading(driver):
+    """Stop every pending request and script load, keeping the DOM built so far."""
+    driver.execute_script("window.stop();")
+
+
+def transferred_bytes(driver) -> int:
+    """Bytes the browser received since the last call, headers included.
+
+    Read from the DevTools performance log (see chrome_options), which
+    every call drains: the encodedDataLength of each finished request.
+    Unlike Resource Timing's transferSize this is known for cross-origin
+    responses too. Requests stopped or still loading aren't counted.
+    """
+    total = 0
+    for entry in driver.get_log('performance'):
+        if 'Network.loadingFinished' not in entry['message']:
+            continue
+        message = json.loads(entry['message'])['message']
+        if message['method'] == 'Network.loadingFinished':
+            total += message['params'].get('encodedDataLength', 0)
+    return int(total)
+
+
+def wait_until_ready(driver, selector: str | None = None,
+                     timeout: float = READY_TIMEOUT, settle_time: float = SETTLE_TIME,
+                     max_bytes: int | None = None, transferred: int = 0) -> int:
+    """Wait until the page is usable instead of sleeping a fixed time.
+
+    With a ``selector`` (XPath when it starts with '/' or '(', CSS
+    otherwise) this returns as soon as a matching element exists. Without
+    one it waits for the document to load and then for both the network
+    (resource count) and the DOM (element count) to stay unchanged for
+    ``settle_time`` seconds. Gives up quietly after ``timeout`` seconds;
+    loading is stopped once the page transferred more than ``max_bytes``.
+
+    ``transferred`` is what the page received before the call (see
+    transferred_bytes); returns the total counted until it returned.
+    """
+    if selector:
+        from selenium.webdriver.common.by import By
+        by = By.XPATH if selector.startswith(('/', '(')) else By.CSS_SELECTOR
+
+    deadline = time.monotonic() + timeout
+    last_probe = None
+    stable_since = None
+    while time.monotonic() < deadline:
+        transferred += transferred_bytes(driver)
+        if max_bytes and transferred > max_bytes:
+            stop_loading(driver)
+            metrics.inc('browser_budget_stops_total', reason='bytes')
+            return transferred
+        if selector:
+            if driver.find_elements(by, selector):
+                return transferred
+        else:
+            state, resources, nodes = driver.execute_script(READY_PROBE)
+            probe = (resources, nodes)
+            now = time.monotonic()
+            if state == 'complete' and probe == last_probe:
+                if stable_since is None:
+                    stable_since = now
+                if now - stable_since >= settle_time:
+                    return transferred
+            else:
+                stable_since = None
+            last_probe = probe
+        time.sleep(0.1)
+    if selector:
+        print(f"Timed out waiting for selector: {selector}")
+    return transferred
+
+
+def render_page(driver, url: str, selector: str | None = None,
+                budget: float = PAGE_BUDGET, max_bytes: int | None = PAGE_BYTE_BUDGET) -> str:
+    """Load ``url`` and return its DOM once ready, or once out of budget.
+
+    ``budget`` bounds the seconds from navigation to snapshot: a page
+    still loading when it runs out is stopped and taken as it is, as is
+    one that transferred more than ``max_bytes``. The bytes received
+    are added to browser_transferred_bytes_total.
+    """
+    from selenium.common.exceptions import TimeoutException
+    transferred_bytes(driver)  # Left over from earlier pages
+    transferred = 0
+    deadline = time.monotonic() + budget
+    driver.set_page_load_timeout(budget)
+    try:
+        driver.get(url)
+    except TimeoutException:
+        stop_loading(driver)
+        metrics.inc('browser_budget_stops_total', reason='time')
+    else:
+        # Scroll once to trigger lazy loading, then wait for the page to settle
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            transferred = wait_until_ready(driver, selector, timeout=min(READY_TIMEOUT, remaining),
+                                           max_bytes=max_bytes)
+        if time.monotonic() >= deadline:
+            stop_loading(driver)
+            metrics.inc('browser_budget_stops_total', reason='time')
+    content = driver.page_source
+    metrics.inc('browser_transferred_bytes_total', transferred + transferred_bytes(driver))
+    return content
+
+
+browser_pool = BrowserPool()
+atexit.register(browser_pool.shutdown)
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+# 'memory' is private to one gunicorn worker, 'sqlite' is shared by all
+# workers on the host through a local file
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_PATH = os.getenv("CACHE_PATH", os.path.join(".cache", "results.db"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Seconds each kind of result stays valid
+TTLS = {
+    'page': int(os.getenv("CACHE_PAGE_TTL", 300)),
+    'selectors': int(os.getenv("CACHE_SELECTORS_TTL", 600)),
+    'rss': int(os.getenv("CACHE_RSS_TTL", 300)),
+    # Served feeds are also invalidated by the worker, this only bounds staleness
+    'feed': int(os.getenv("CACHE_FEED_TTL", 3600)),
+    # Ids /feed/<id> found no stored feed for, so probing ids can't
+    # cost a database query each
+    'feed_missing': int(os.getenv("CACHE_FEED_MISSING_TTL", 60)),
+}
+DEFAULT_TTL = 300
+
+
+def make_key(*parts) -> str:
+    """Stable cache key for a tuple of JSON-serializable parts."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _sizeof(value) -> int:
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    return len(pickle.dumps(value))
+
+
+class MemoryBackend:
+    """In-process LRU bounded by the total size of the stored values."""
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, size, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                self._size -= size
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: int):
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            self._entries[key] = (time.time() + ttl, size, value)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def delete(self, key: str):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= entry[1]
+
+
+class SQLiteBackend:
+    """LRU cache in a local SQLite file, shared by every process on the host."""
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value, ttl: int):
+        blob = pickle.dumps(value)
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now + ttl, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+                "SELECT key, size FROM cache ORDER BY accessed_at").fetchall():
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+
+class ResultCache:
+    """Namespaced cache front-end that keeps hit/miss counters."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+    def get(self, namespace: str, key: str):
+        try:
+            value = self.backend.get(f"{namespace}:{key}")
+        except Exception as e:
+            print(f"Cache read failed: {str(e)}")
+            value = None
+        with self._lock:
+            self._stats[namespace]['hits' if value is not None else 'misses'] += 1
+        return value
+
+    def set(self, namespace: str, key: str, value, ttl: int | None = None):
+        try:
+            self.backend.set(f"{namespace}:{key}", value, ttl or TTLS.get(namespace, DEFAULT_TTL))
+        except Exception as e:
+            print(f"Cache write failed: {str(e)}")
+
+    def delete(self, namespace: str, key: str):
+        self.backend.delete(f"{namespace}:{key}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {namespace: dict(counts) for namespace, counts in self._stats.items()}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResultCache:
+    """Return the process-wide cache for the configured backend."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            if CACHE_BACKEND == 'sqlite':
+                backend = SQLiteBackend()
+            else:
+                backend = MemoryBackend()
+            _cache = ResultCache(backend)
+        return _cache
@@ -0,0 +1,87 @@
+import os
+import queue
+import threading
+
+from metrics import metrics
+
+# Rows per catalog request, and how many pages are read ahead of the
+# page being refreshed
+CATALOG_PAGE_SIZE = int(os.getenv("WORKER_CATALOG_PAGE_SIZE", 1000))
+CATALOG_PREFETCH = int(os.getenv("WORKER_CATALOG_PREFETCH", 2))
+
+# The rss_feeds columns the worker reads: what it refreshes from and
+# what it compares the new file URL with
+FEED_COLUMNS = ('id', 'url', 'title_xpath', 'description_xpath', 'rss_file_url')
+# Paginated feeds keep their spec in a jsonb rss_feeds.pagination column.
+# Set once the table has it: only then does the worker read the column
+# and the app accept and store pagination specs
+PAGINATION_COLUMN = os.getenv("FEED_PAGINATION_COLUMN", "0").lower() in ('1', 'true', 'yes')
+if PAGINATION_COLUMN:
+    FEED_COLUMNS += ('pagination',)
+
+
+def iter_catalog(client, page_size: int = CATALOG_PAGE_SIZE, columns=FEED_COLUMNS,
+                 table: str = 'rss_feeds'):
+    """Yield the rows of ``table`` in pages of ``page_size``, ordered by id.
+
+    Pages are read by keyset: each request asks for the rows after the
+    last id seen, which the primary key index answers directly at any
+    depth (an offset has to skip every earlier row), and rows added or
+    deleted meanwhile can't shift a row into the wrong page.
+    """
+    last_id = None
+    while True:
+        query = client.table(table).select(','.join(columns)).order('id').limit(page_size)
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        with metrics.span('catalog_page'):
+            rows = query.execute().data or []
+        metrics.inc('catalog_rows_total', len(rows))
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]['id']
+
+
+def prefetch(iterable, depth: int = CATALOG_PREFETCH):
+    """Iterate ``iterable`` on a background thread, up to ``depth`` items ahead.
+
+    Lets the next catalog page be requested while the current one is
+    being worked on. Errors of the iterable are raised to the consumer;
+    a consumer that stops early lets the thread finish at its next item.
+    """
+    items = queue.Queue(maxsize=max(1, depth))
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            put((done, e))
+        else:
+            put((done, None))
+
+    threading.Thread(target=produce, name='catalog-prefetch', daemon=True).start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
@@ -0,0 +1,63 @@
+import gzip
+import hashlib
+import os
+import re
+import time
+from email.utils import parsedate_to_datetime
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# How long readers and proxies may reuse a served feed without revalidating
+FEED_MAX_AGE = int(os.getenv("FEED_MAX_AGE", 300))
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+_LAST_BUILD_DATE = re.compile(rb'<lastBuildDate>([^<]+)</lastBuildDate>')
+
+
+def last_build_time(body: bytes) -> float | None:
+    """Timestamp of the feed's <lastBuildDate>, if it has a parseable one."""
+    match = _LAST_BUILD_DATE.search(body, 0, 4096)
+    if not match:
+        return None
+    try:
+        return parsedate_to_datetime(match.group(1).decode('ascii').strip()).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def render_entry(body: bytes, fetched_at: float | None = None) -> dict:
+    """Cache entry for a rendered feed: the body, its compressed variants and validators.
+
+    Variants are compressed once here so serving a request never
+    compresses. Each gets its own strong ETag since they are different
+    byte sequences. Last-Modified is the feed's lastBuildDate, falling
+    back to when the body was loaded.
+    """
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    variants = {'identity': body}
+    if len(body) >= MIN_COMPRESS_BYTES:
+        variants['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            variants['br'] = brotli.compress(body)
+    return {
+        'variants': variants,
+        'etags': {encoding: digest if encoding == 'identity' else f"{digest}-{encoding}"
+                  for encoding in variants},
+        'last_modified': last_build_time(body) or fetched_at or time.time(),
+    }
+
+
+def choose_encoding(entry: dict, accept_encodings) -> str:
+    """Best stored variant the client accepts; brotli first, then gzip.
+
+    ``accept_encodings`` is the request's parsed Accept-Encoding header
+    (werkzeug's ``request.accept_encodings``).
+    """
+    for encoding in ('br', 'gzip'):
+        if encoding in entry['variants'] and accept_encodings[encoding]:
+            return encoding
+    return 'identity'
@@ -0,0 +1,199 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+# Local state that has to survive between worker runs (persisted by the
+# GitHub Actions cache in .github/workflows/worker.yml)
+STATE_PATH = os.getenv("FEED_STATE_PATH", os.path.join(".feed_state", "feed_state.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fetch_meta (
+    feed_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    selectors TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT,
+    feed_hash TEXT,
+    updated_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS schedule (
+    feed_id TEXT PRIMARY KEY,
+    next_due REAL NOT NULL,
+    interval REAL NOT NULL,
+    change_interval REAL,
+    last_change_at REAL,
+    failures INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS items (
+    feed_id TEXT NOT NULL,
+    guid TEXT NOT NULL,
+    title TEXT,
+    link TEXT,
+    description TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    position INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (feed_id, guid)
+);
+"""
+
+# Columns added since a table was first created, as (table, column, definition);
+# state files restored from an older run's cache get them on open
+MIGRATIONS = (
+    ('items', 'position', 'INTEGER NOT NULL DEFAULT 0'),
+    ('fetch_meta', 'feed_hash', 'TEXT'),
+)
+
+
+class FeedState:
+    """Small SQLite store for per-feed refresh state."""
+
+    def __init__(self, path: str = STATE_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+        for table, column, definition in MIGRATIONS:
+            columns = {row['name'] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        self._conn.commit()
+
+    def get_fetch_meta(self, feed_id) -> dict:
+        """Return stored validators, content hash and uploaded feed hash (empty if unknown)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, selectors, etag, last_modified, content_hash, feed_hash "
+                "FROM fetch_meta WHERE feed_id = ?",
+                (str(feed_id),)
+            ).fetchone()
+        return dict(row) if row else {}
+
+    def save_fetch_meta(self, feed_id, meta: dict):
+        """Insert or replace the fetch metadata of a feed."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fetch_meta "
+                "(feed_id, url, selectors, etag, last_modified, content_hash, feed_hash, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    str(feed_id),
+                    meta.get('url'),
+                    meta.get('selectors'),
+                    meta.get('etag'),
+                    meta.get('last_modified'),
+                    meta.get('content_hash'),
+                    meta.get('feed_hash'),
+                    datetime.now().isoformat()
+                )
+            )
+            self._conn.commit()
+
+    def get_schedules(self) -> dict:
+        """Return every stored schedule entry keyed by feed id."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT feed_id, next_due, interval, change_interval, last_change_at, failures "
+                "FROM schedule"
+            ).fetchall()
+        return {row['feed_id']: dict(row) for row in rows}
+
+    def get_schedule(self, feed_id) -> dict:
+        """Return the schedule entry of a feed (empty if it was never refreshed)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT feed_id, next_due, interval, change_interval, last_change_at, failures "
+                "FROM schedule WHERE feed_id = ?",
+                (str(feed_id),)
+            ).fetchone()
+        return dict(row) if row else {}
+
+    def save_schedule(self, entry: dict):
+        """Insert or replace a schedule entry."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO schedule "
+                "(feed_id, next_due, interval, change_interval, last_change_at, failures) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    str(entry['feed_id']),
+                    entry['next_due'],
+                    entry['interval'],
+                    entry.get('change_interval'),
+                    entry.get('last_change_at'),
+                    entry.get('failures', 0)
+                )
+            )
+            self._conn.commit()
+
+    def merge_items(self, feed_id, items: list[dict], history_size: int,
+                    now: float | None = None) -> list[dict]:
+        """Record freshly extracted items and return the feed's rolling window.
+
+        Known items keep their first-seen time; new ones get ``now``, and
+        items first seen together stay in the order the page listed them.
+        Every item of the current page is kept, plus as many of the most
+        recently first-seen older items as fit in ``history_size``: an
+        evicted item still on the page would come back as new next time.
+        The result lists the current page's items in page order, followed
+        by older items still in the window, each with a ``pubdate``.
+        """
+        now = time.time() if now is None else now
+        feed_id = str(feed_id)
+        current = list(dict.fromkeys(item['guid'] for item in items))
+        with self._lock:
+            for position, item in enumerate(items):
+                self._conn.execute(
+                    "INSERT INTO items (feed_id, guid, title, link, description, first_seen, last_seen, position) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (feed_id, guid) DO UPDATE SET "
+                    "title = excluded.title, description = excluded.description, "
+                    "last_seen = excluded.last_seen",
+                    (feed_id, item['guid'], item['title'], item['link'],
+                     item['description'], now, now, position)
+                )
+            # Items seen in this call are the ones with last_seen = now
+            self._conn.execute(
+                "DELETE FROM items WHERE feed_id = ? AND last_seen < ? AND guid NOT IN ("
+                "SELECT guid FROM items WHERE feed_id = ? AND last_seen < ? "
+                "ORDER BY first_seen DESC, position LIMIT ?)",
+                (feed_id, now, feed_id, now, max(0, history_size - len(current)))
+            )
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT guid, title, link, description, first_seen FROM items "
+                "WHERE feed_id = ? ORDER BY first_seen DESC, position",
+                (feed_id,)
+            ).fetchall()
+
+        stored = {row['guid']: dict(row) for row in rows}
+        seen = set(current)
+        ordered = current + [guid for guid in stored if guid not in seen]
+        return [
+            {
+                **stored[guid],
+                'pubdate': datetime.fromtimestamp(stored[guid]['first_seen'], timezone.utc)
+            }
+            for guid in ordered
+        ]
+
+    def known_links(self, feed_id) -> set:
+        """Links of the items kept for a feed (see merge_items)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT link FROM items WHERE feed_id = ? AND link IS NOT NULL",
+                (str(feed_id),)
+            ).fetchall()
+        return {row['link'] for row in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,164 @@
+import os
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from metrics import metrics
+from host_health import host_health
+
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    # requests can only decode br bodies when a brotli package is installed
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': ACCEPT_ENCODING,
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Cache-Control': 'max-age=0'
+}
+
+# Connection timeout, read timeout
+DEFAULT_TIMEOUT = (
+    float(os.getenv("FETCH_CONNECT_TIMEOUT", 10)),
+    float(os.getenv("FETCH_READ_TIMEOUT", 30))
+)
+# Number of per-host pools kept alive, and connections kept per host
+POOL_HOSTS = int(os.getenv("FETCH_POOL_HOSTS", 64))
+POOL_PER_HOST = int(os.getenv("FETCH_POOL_PER_HOST", 8))
+
+_stats_lock = threading.Lock()
+_stats = {'requests': 0, 'connections_opened': 0}
+
+
+def _count(key: str, amount: int = 1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _count('connections_opened')
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _count('connections_opened')
+        return super()._new_conn()
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools count the connections they open."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool
+        }
+
+
+# One adapter (and so one connection pool) for the whole process; sessions
+# are per thread so cookie jars are never shared between threads.
+_adapter = PooledAdapter(
+    pool_connections=POOL_HOSTS,
+    pool_maxsize=POOL_PER_HOST,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False
+    )
+)
+_local = threading.local()
+
+
+def get_session() -> requests.Session:
+    """Return this thread's session, backed by the shared connection pool."""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update(DEFAULT_HEADERS)
+        session.mount('http://', _adapter)
+        session.mount('https://', _adapter)
+        _local.session = session
+    return session
+
+
+def fetch(url: str, headers: dict | None = None, timeout=DEFAULT_TIMEOUT,
+          verify: bool = True, stream: bool = False) -> requests.Response:
+    """GET a URL through the shared pool with retries and timeouts.
+
+    Requests go through the host's health tracker: they wait for its rate
+    limit, fail fast with HostUnavailable while its circuit is open, and
+    their outcome feeds the circuit breaker.
+    """
+    host_health.before_request(url)
+    _count('requests')
+    try:
+        response = get_session().get(
+            url,
+            headers=headers,
+            timeout=timeout,
+            verify=verify,
+            stream=stream,
+            allow_redirects=True
+        )
+    except requests.RequestException:
+        host_health.record_failure(url)
+        raise
+    if response.status_code >= 500 or response.status_code == 429:
+        host_health.record_failure(url)
+    else:
+        host_health.record_success(url)
+    return response
+
+
+def iter_body(response: requests.Response, chunk_size: int = 64 * 1024):
+    """Iterate a streamed body, counting the bytes received per host."""
+    host = urlparse(response.url).netloc.lower()
+    for chunk in response.iter_content(chunk_size):
+        metrics.inc('fetch_bytes_total', len(chunk), host=host)
+        yield chunk
+
+
+def read_body(response: requests.Response, max_bytes: int | None = None,
+              chunk_size: int = 64 * 1024) -> bytes:
+    """Read a streamed response body, stopping after ``max_bytes``."""
+    chunks = []
+    received = 0
+    with response:
+        for chunk in iter_body(response, chunk_size):
+            if max_bytes is not None:
+                chunk = chunk[:max_bytes - received]
+            if not chunk:
+                break
+            chunks.append(chunk)
+            received += len(chunk)
+            if max_bytes is not None and received >= max_bytes:
+                break
+    return b''.join(chunks)
+
+
+def fetch_stats() -> dict:
+    """Return request/connection counters for the shared pool."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['connections_reused'] = max(0, stats['requests'] - stats['connections_opened'])
+    return stats
+
+
+metrics.register_collector(
+    lambda: [(f"http_pool_{name}", {}, value) for name, value in fetch_stats().items()]
+)
@@ -0,0 +1,207 @@
+import json
+import os
+import threading
+import time
+
+import requests
+
+from metrics import metrics
+from refresh import host_of
+
+# Sustained requests per second and burst allowed against one host
+HOST_RATE = float(os.getenv("HOST_RATE_PER_SECOND", 2.0))
+HOST_BURST = float(os.getenv("HOST_BURST", 5))
+# Consecutive failures that open a host's circuit, and how long it stays
+# open before a single probe request is let through
+FAILURE_THRESHOLD = int(os.getenv("HOST_FAILURE_THRESHOLD", 5))
+OPEN_SECONDS = float(os.getenv("HOST_OPEN_SECONDS", 300))
+# How long a 'needs_selenium' or 'blocked' verdict is trusted
+VERDICT_TTL = float(os.getenv("HOST_VERDICT_TTL", 6 * 60 * 60))
+
+NEEDS_SELENIUM = 'needs_selenium'
+BLOCKED = 'blocked'
+
+
+class HostUnavailable(requests.RequestException):
+    """Raised instead of requesting a host whose circuit is open or that blocks us."""
+
+
+class TokenBucket:
+    """Allows ``rate`` requests per second on average, with bursts up to ``burst``.
+
+    A ``rate`` of 0 or less disables the limit.
+    """
+
+    def __init__(self, rate: float = HOST_RATE, burst: float = HOST_BURST):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token and return how long to wait before using it (not thread-safe)."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class HostHealth:
+    """Circuit and verdict of one host."""
+
+    def __init__(self, rate: float, burst: float):
+        self.bucket = TokenBucket(rate, burst)
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.verdict = None
+        self.verdict_until = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'failures': self.failures,
+            'open_until': self.open_until,
+            'verdict': self.verdict,
+            'verdict_until': self.verdict_until,
+        }
+
+
+class HostHealthTracker:
+    """Per-host rate limits, circuit breakers and fetch-strategy verdicts.
+
+    - Rate limit: every request first waits for a token from the host's
+      bucket.
+    - Circuit breaker: FAILURE_THRESHOLD consecutive failures (errors,
+      5xx, 429) open the circuit; requests then fail fast with
+      HostUnavailable until OPEN_SECONDS have passed, when one probe is
+      let through. Its success closes the circuit, a failure reopens it.
+    - Verdicts: callers remember that a host only works with Selenium
+      (NEEDS_SELENIUM) or not at all (BLOCKED) for VERDICT_TTL seconds.
+
+    Times are wall-clock so the state can be saved between worker runs.
+    """
+
+    def __init__(self, rate: float = HOST_RATE, burst: float = HOST_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _health(self, host: str) -> HostHealth:
+        health = self._hosts.get(host)
+        if health is None:
+            health = self._hosts[host] = HostHealth(self.rate, self.burst)
+        return health
+
+    @staticmethod
+    def _rejection(health: HostHealth, now: float) -> str | None:
+        if health.verdict == BLOCKED and health.verdict_until > now:
+            return 'blocked'
+        # Past open_until only the one probe request may go through
+        if health.open_until > now or (health.open_until and health.probing):
+            return 'circuit_open'
+        return None
+
+    def before_request(self, url: str):
+        """Wait for the host's rate limit; raise HostUnavailable if it shouldn't be asked."""
+        host = host_of(url)
+        with self._lock:
+            health = self._health(host)
+            reason = self._rejection(health, time.time())
+            if reason is not None:
+                metrics.inc('host_rejections_total', reason=reason)
+                if reason == 'blocked':
+                    raise HostUnavailable(f"{host} is blocking requests")
+                raise HostUnavailable(f"Circuit open for {host} after {health.failures} failures")
+            if health.open_until:
+                health.probing = True  # Half-open: this request is the probe
+            wait = health.bucket.reserve()
+        if wait > 0:
+            metrics.inc('host_rate_limit_seconds_total', wait)
+            time.sleep(wait)
+
+    def record_success(self, url: str):
+        with self._lock:
+            health = self._health(host_of(url))
+            health.failures = 0
+            health.open_until = 0.0
+            health.probing = False
+
+    def record_failure(self, url: str):
+        with self._lock:
+            health = self._health(host_of(url))
+            health.failures += 1
+            health.probing = False
+            if health.failures >= FAILURE_THRESHOLD:
+                if not health.open_until or health.open_until <= time.time():
+                    metrics.inc('host_circuit_opened_total')
+                health.open_until = time.time() + OPEN_SECONDS
+
+    def set_verdict(self, url: str, verdict: str | None, ttl: float = VERDICT_TTL):
+        """Remember how a host has to be fetched (None forgets it)."""
+        with self._lock:
+            health = self._health(host_of(url))
+            health.verdict = verdict
+            health.verdict_until = time.time() + ttl if verdict else 0.0
+
+    def verdict(self, url: str) -> str | None:
+        with self._lock:
+            health = self._hosts.get(host_of(url))
+            if health is None or health.verdict_until <= time.time():
+                return None
+            return health.verdict
+
+    def is_available(self, url: str) -> bool:
+        """False while requests to the host would fail fast."""
+        with self._lock:
+            health = self._hosts.get(host_of(url))
+            return health is None or self._rejection(health, time.time()) is None
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            hosts = list(self._hosts.values())
+        return {
+            'hosts': len(hosts),
+            'open_circuits': sum(h.open_until > now for h in hosts),
+            'needs_selenium': sum(h.verdict == NEEDS_SELENIUM and h.verdict_until > now for h in hosts),
+            'blocked': sum(h.verdict == BLOCKED and h.verdict_until > now for h in hosts),
+        }
+
+    def save(self, path: str):
+        """Write circuits and verdicts worth keeping to a JSON file."""
+        now = time.time()
+        with self._lock:
+            snapshot = {
+                host: health.to_dict() for host, health in self._hosts.items()
+                if health.failures or health.verdict_until > now
+            }
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(snapshot, f)
+
+    def load(self, path: str):
+        """Restore state written by save(); a missing or broken file is ignored."""
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            for host, saved in snapshot.items():
+                health = self._health(host)
+                health.failures = saved.get('failures', 0)
+                health.open_until = saved.get('open_until', 0.0)
+                health.verdict = saved.get('verdict')
+                health.verdict_until = saved.get('verdict_until', 0.0)
+
+
+host_health = HostHealthTracker()
+
+metrics.register_collector(lambda: [
+    (f"host_health_{name}", {}, value) for name, value in host_health.stats().items()
+])
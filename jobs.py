@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", 32))
+# How long finished jobs stay available for polling
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", 600))
+
+FINISHED = ('done', 'failed', 'cancelled')
+
+
+class QueueFull(Exception):
+    """Raised when too many jobs are already waiting."""
+
+
+class JobCancelled(Exception):
+    """Raised by a job function that noticed it was cancelled."""
+
+
+class Job:
+    """State of one background job."""
+
+    def __init__(self, key: str):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    def to_dict(self) -> dict:
+        data = {'job_id': self.id, 'status': self.status}
+        if self.status == 'done':
+            data['result'] = self.result
+        if self.error:
+            data['error'] = self.error
+        return data
+
+
+class JobQueue:
+    """Bounded background executor with de-duplication of in-flight keys.
+
+    Submitting a key that is already queued or running returns the
+    existing job instead of starting another one. Jobs live in this
+    process: a job is polled through the worker that started it, so the
+    app runs as a single gunicorn worker (see Procfile).
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS, max_pending: int = JOB_MAX_PENDING,
+                 result_ttl: int = JOB_RESULT_TTL):
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._in_flight = {}
+        self._changed = threading.Condition()
+
+    def submit(self, key: str, fn, *args) -> Job:
+        """Run fn(*args, cancel_event) in the background under ``key``."""
+        with self._changed:
+            self._cleanup()
+            existing = self._in_flight.get(key)
+            if existing is not None:
+                return existing
+            pending = sum(1 for job in self._in_flight.values() if job.status == 'queued')
+            if pending >= self.max_pending:
+                raise QueueFull("Too many jobs waiting, try again later")
+
+            job = Job(key)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+            job.future = self._executor.submit(self._run, job, fn, args)
+            return job
+
+    def _run(self, job: Job, fn, args):
+        with self._changed:
+            if job.cancel_event.is_set():
+                return
+            job.status = 'running'
+            self._changed.notify_all()
+        try:
+            result = fn(*args, job.cancel_event)
+            status, error = 'done', None
+        except JobCancelled:
+            result, status, error = None, 'cancelled', None
+        except Exception as e:
+            result, status, error = None, 'failed', str(e)
+        self._finish(job, status, result, error)
+
+    def _finish(self, job: Job, status: str, result=None, error=None):
+        with self._changed:
+            if job.status in FINISHED:
+                return
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finished_at = time.time()
+            if self._in_flight.get(job.key) is job:
+                del self._in_flight[job.key]
+            self._changed.notify_all()
+
+    def get(self, job_id: str) -> Job | None:
+        with self._changed:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Job | None:
+        """Cancel a job; running jobs stop at their next cancellation check."""
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+        job.cancel_event.set()
+        if job.future.cancel() or job.status == 'queued':
+            self._finish(job, 'cancelled')
+        return job
+
+    def wait_for_change(self, job: Job, last_status: str | None, timeout: float) -> str:
+        """Block until the job's status differs from ``last_status`` or timeout."""
+        with self._changed:
+            self._changed.wait_for(lambda: job.status != last_status, timeout=timeout)
+            return job.status
+
+    def _cleanup(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
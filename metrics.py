@@ -0,0 +1,146 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram buckets for stage durations, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Metrics:
+    """Process-wide counters and histograms with labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        """Increase a counter."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        """Record a value in a histogram."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, stage: str, **labels):
+        """Time a pipeline stage into stage_seconds, counting failures."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc('stage_errors_total', stage=stage, **labels)
+            raise
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - started, stage=stage, **labels)
+
+    def register_collector(self, collect):
+        """Add a callable returning extra gauges as (name, labels, value) tuples."""
+        self._collectors.append(collect)
+
+    def _collected(self) -> list[tuple]:
+        gauges = []
+        for collect in self._collectors:
+            try:
+                for name, labels, value in collect():
+                    gauges.append((name, _label_key(labels), value))
+            except Exception as e:
+                print(f"Metrics collector failed: {str(e)}")
+        return gauges
+
+    def render_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            snapshot = [
+                (key, histogram.buckets, list(histogram.counts), histogram.count, histogram.sum)
+                for key, histogram in histograms
+            ]
+        lines = []
+        declared = set()
+        for (name, labels), value in counters:
+            if name not in declared:
+                lines.append(f"# TYPE {name} counter")
+                declared.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), buckets, counts, count, total in snapshot:
+            if name not in declared:
+                lines.append(f"# TYPE {name} histogram")
+                declared.add(name)
+            for bound, bucket_count in zip(buckets, counts):
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', str(bound)),))} {bucket_count}")
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for name, labels, value in sorted(self._collected()):
+            if name not in declared:
+                lines.append(f"# TYPE {name} gauge")
+                declared.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> dict:
+        """Machine-readable snapshot of all metrics."""
+        with self._lock:
+            counters = [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'mean': histogram.sum / histogram.count if histogram.count else 0.0,
+                    'buckets': dict(zip((str(b) for b in histogram.buckets), histogram.counts)),
+                }
+                for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0])
+            ]
+        gauges = [
+            {'name': name, 'labels': dict(labels), 'value': value}
+            for name, labels, value in sorted(self._collected())
+        ]
+        return {'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+
+metrics = Metrics()
@@ -0,0 +1,60 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Sampling interval in seconds and where finished profiles are written
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+
+class SamplingProfiler:
+    """Periodically sample one thread's stack into folded-stack counts.
+
+    The output (``frame;frame;frame count`` per line) can be fed to
+    flamegraph.pl or speedscope. Sampling from a separate thread keeps
+    the overhead roughly constant regardless of how much Python code the
+    profiled thread runs.
+    """
+
+    def __init__(self, thread_id: int | None = None, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, daemon=True, name='profiler')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def folded(self) -> str:
+        return '\n'.join(f"{stack} {count}" for stack, count in self.samples.most_common()) + '\n'
+
+    def save(self, name: str) -> str:
+        """Write the folded stacks to PROFILE_DIR and return the file path."""
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        safe_name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)
+        path = os.path.join(PROFILE_DIR, f"{int(time.time() * 1000)}-{safe_name}.folded")
+        with open(path, 'w') as f:
+            f.write(self.folded())
+        return path
@@ -0,0 +1,251 @@
+import math
+import threading
+import time
+import zlib
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urlunsplit, urlparse
+
+
+def host_of(url: str) -> str:
+    """Return the lowercased host part of a URL."""
+    return urlparse(url).netloc.lower()
+
+
+class HostThrottle:
+    """Cap concurrent requests per host and space them by a politeness delay."""
+
+    def __init__(self, per_host_limit: int = 2, delay: float = 1.0):
+        self.per_host_limit = max(1, per_host_limit)
+        self.delay = max(0.0, delay)
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_start = defaultdict(float)
+
+    def _semaphore(self, host: str) -> threading.Semaphore:
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._semaphores[host]
+
+    def pace(self, url: str):
+        """Wait out the politeness delay before one more request to the host.
+
+        For requests made under a slot already held, such as the later
+        pages of a paginated feed.
+        """
+        host = host_of(url)
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_start[host])
+            self._next_start[host] = start_at + self.delay
+        if start_at > now:
+            time.sleep(start_at - now)
+
+    @contextmanager
+    def slot(self, url: str):
+        """Hold one of the host's slots, waiting out the politeness delay first."""
+        with self._semaphore(host_of(url)):
+            self.pace(url)
+            yield
+
+    @contextmanager
+    def extra_slots(self, url: str, wanted: int):
+        """Take up to ``wanted`` more of the host's free slots without waiting.
+
+        Yields how many were taken. Never blocks, so a caller already
+        holding a slot can't deadlock against others doing the same.
+        """
+        semaphore = self._semaphore(host_of(url))
+        taken = 0
+        try:
+            while taken < wanted and semaphore.acquire(blocking=False):
+                taken += 1
+            yield taken
+        finally:
+            for _ in range(taken):
+                semaphore.release()
+
+
+def source_key(url: str) -> str:
+    """Normalize a page URL so feeds reading the same page compare equal.
+
+    Scheme and host are case-insensitive, default ports and fragments
+    never reach the server, and an empty path is the root.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None  # Left for the request to reject
+    if (scheme, port) in (('http', 80), ('https', 443)):
+        netloc = netloc.rsplit(':', 1)[0]
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+
+def group_by_source(feeds: list[dict]) -> list[dict]:
+    """Group feeds by source page, as {'url': ..., 'feeds': [...]} in first-seen order."""
+    groups = {}
+    for feed in feeds:
+        key = source_key(feed['url'])
+        if key not in groups:
+            groups[key] = {'url': feed['url'], 'feeds': []}
+        groups[key]['feeds'].append(feed)
+    return list(groups.values())
+
+
+class SourceGrouper:
+    """group_by_source for feeds arriving in batches while earlier groups run.
+
+    A feed joins the group of its page as long as that group hasn't
+    started; once it has, the page gets a new group (and a second fetch).
+    """
+
+    def __init__(self):
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def add(self, feeds: list[dict]) -> list[dict]:
+        """Group a batch of feeds and return the groups it opened."""
+        opened = []
+        with self._lock:
+            for feed in feeds:
+                key = source_key(feed['url'])
+                group = self._groups.get(key)
+                if group is None or group['started']:
+                    group = self._groups[key] = {'url': feed['url'], 'feeds': [], 'started': False}
+                    opened.append(group)
+                group['feeds'].append(feed)
+        return opened
+
+    def start(self, group: dict) -> list[dict]:
+        """Close ``group`` to newcomers and return its feeds."""
+        with self._lock:
+            group['started'] = True
+            return list(group['feeds'])
+
+
+def interleave_by_host(feeds: list[dict]) -> list[dict]:
+    """Order feeds round-robin across hosts so one busy host can't hog the pool."""
+    queues = defaultdict(deque)
+    for feed in feeds:
+        queues[host_of(feed['url'])].append(feed)
+
+    ordered = []
+    while queues:
+        for host in list(queues):
+            ordered.append(queues[host].popleft())
+            if not queues[host]:
+                del queues[host]
+    return ordered
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def refresh_concurrently(feeds: list[dict], update, max_workers: int = 8,
+                         per_host_limit: int = 2, host_delay: float = 1.0) -> dict:
+    """Run update(feed) for every feed on a bounded thread pool.
+
+    Returns a stats dict with success/failure counts, throughput and
+    latency percentiles (in seconds) of the individual updates.
+    """
+    return refresh_batches([feeds], update, max_workers, per_host_limit, host_delay)
+
+
+def refresh_batches(batches, update, max_workers: int = 8, per_host_limit: int = 2,
+                    host_delay: float = 1.0, throttle: HostThrottle | None = None) -> dict:
+    """refresh_concurrently for feeds arriving in batches (pages of the catalog).
+
+    Each batch is queued on the pool as soon as it arrives, so updates
+    start while later batches are still being read. Hosts are
+    interleaved within a batch. Pass a ``throttle`` to share it with
+    requests update() makes beyond its feed's page.
+    """
+    if throttle is None:
+        throttle = HostThrottle(per_host_limit, host_delay)
+    latencies = []
+    successful = 0
+
+    def run(feed):
+        with throttle.slot(feed['url']):
+            started = time.perf_counter()
+            try:
+                ok = update(feed)
+            except Exception as e:
+                print(f"Error updating feed {feed['url']}: {str(e)}")
+                ok = False
+            return ok, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = [
+            executor.submit(run, feed)
+            for batch in batches
+            for feed in interleave_by_host(batch)
+        ]
+        for future in as_completed(futures):
+            ok, latency = future.result()
+            latencies.append(latency)
+            if ok:
+                successful += 1
+    elapsed = time.perf_counter() - started
+    total = len(futures)
+
+    return {
+        'total': total,
+        'successful': successful,
+        'failed': total - successful,
+        'elapsed': elapsed,
+        'throughput': total / elapsed if elapsed else 0.0,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p90': percentile(latencies, 90),
+        'latency_p99': percentile(latencies, 99),
+        'latency_max': max(latencies, default=0.0),
+    }
+
+
+def format_stats(stats: dict, unit: str = 'feeds') -> str:
+    """Render refresh stats as a short human-readable report."""
+    return (
+        f"Refreshed {stats['total']} {unit} in {stats['elapsed']:.1f}s "
+        f"({stats['throughput']:.2f} {unit}/s), "
+        f"{stats['successful']} ok / {stats['failed']} failed\n"
+        f"Latency p50={stats['latency_p50']:.2f}s "
+        f"p90={stats['latency_p90']:.2f}s "
+        f"p99={stats['latency_p99']:.2f}s "
+        f"max={stats['latency_max']:.2f}s"
+    )
+
+
+def shard_of(feed_id, shard_count: int) -> int:
+    """Shard a feed belongs to; crc32 keeps this stable across processes and runs."""
+    return zlib.crc32(str(feed_id).encode('utf-8')) % shard_count
+
+
+def shard_feeds(feeds: list[dict], shard_index: int, shard_count: int) -> list[dict]:
+    """The slice of ``feeds`` that shard ``shard_index`` of ``shard_count`` refreshes."""
+    return [feed for feed in feeds if shard_of(feed['id'], shard_count) == shard_index]
+
+
+def combine_stats(shard_stats: list[dict]) -> dict:
+    """Totals over shards that ran side by side (percentiles don't combine)."""
+    total = sum(stats['total'] for stats in shard_stats)
+    elapsed = max((stats['elapsed'] for stats in shard_stats), default=0.0)
+    return {
+        'total': total,
+        'successful': sum(stats['successful'] for stats in shard_stats),
+        'failed': sum(stats['failed'] for stats in shard_stats),
+        'elapsed': elapsed,
+        'throughput': total / elapsed if elapsed else 0.0,
+        'latency_max': max((stats['latency_max'] for stats in shard_stats), default=0.0),
+    }
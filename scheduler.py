@@ -0,0 +1,104 @@
+import heapq
+import os
+import time
+
+# Bounds and defaults for per-feed refresh intervals, in seconds
+MIN_INTERVAL = float(os.getenv("SCHEDULE_MIN_INTERVAL", 15 * 60))
+MAX_INTERVAL = float(os.getenv("SCHEDULE_MAX_INTERVAL", 24 * 60 * 60))
+DEFAULT_INTERVAL = float(os.getenv("SCHEDULE_DEFAULT_INTERVAL", 60 * 60))
+# Growth of the interval for every refresh that finds nothing new
+STALE_BACKOFF = 1.5
+# Weight of the newest observation in the learned change interval
+CHANGE_RATE_ALPHA = 0.3
+# Failures past this many no longer double the retry interval (it is
+# clamped to MAX_INTERVAL long before; this keeps 2 ** n finite)
+MAX_BACKOFF_EXPONENT = 16
+
+
+def clamp(interval: float) -> float:
+    return max(MIN_INTERVAL, min(MAX_INTERVAL, interval))
+
+
+class FeedScheduler:
+    """Decides which feeds are due, learning each feed's change rate.
+
+    Every refresh is recorded as 'changed', 'unchanged' or 'error':
+
+    - changed: the time since the previous change updates an exponential
+      moving average of the feed's change interval, and the feed is next
+      polled after half of it (busy feeds speed up).
+    - unchanged: the poll interval grows by STALE_BACKOFF (stale feeds
+      slow down until they change again).
+    - error: the interval doubles with every consecutive failure.
+
+    Intervals are clamped to [MIN_INTERVAL, MAX_INTERVAL].
+    """
+
+    def __init__(self, state):
+        self.state = state
+
+    def due_queue(self, feeds: list[dict], schedules: dict | None = None) -> list[tuple]:
+        """Heap of (next_due, feed_id, feed); never refreshed feeds are due now.
+
+        ``schedules`` (from state.get_schedules()) saves reading them again
+        when the catalog is checked page by page.
+        """
+        if schedules is None:
+            schedules = self.state.get_schedules()
+        heap = [
+            (schedules.get(str(feed['id']), {}).get('next_due', 0.0), str(feed['id']), feed)
+            for feed in feeds
+        ]
+        heapq.heapify(heap)
+        return heap
+
+    def pop_due(self, heap: list[tuple], now: float | None = None) -> list[dict]:
+        """Pop every feed whose due time has passed, earliest first."""
+        now = time.time() if now is None else now
+        due = []
+        while heap and heap[0][0] <= now:
+            due.append(heapq.heappop(heap)[2])
+        return due
+
+    def due_feeds(self, feeds: list[dict], now: float | None = None,
+                  schedules: dict | None = None) -> list[dict]:
+        """Feeds that should be refreshed on this tick."""
+        return self.pop_due(self.due_queue(feeds, schedules), now)
+
+    def record(self, feed_id, outcome: str, now: float | None = None) -> dict:
+        """Store the outcome of a refresh and schedule the next one."""
+        now = time.time() if now is None else now
+        entry = self.state.get_schedule(feed_id) or {
+            'feed_id': str(feed_id),
+            'interval': DEFAULT_INTERVAL,
+            'change_interval': None,
+            'last_change_at': None,
+            'failures': 0
+        }
+
+        if outcome == 'error':
+            entry['failures'] = entry.get('failures', 0) + 1
+            interval = DEFAULT_INTERVAL * 2 ** min(entry['failures'], MAX_BACKOFF_EXPONENT)
+        elif outcome == 'changed':
+            entry['failures'] = 0
+            if entry.get('last_change_at'):
+                observed = now - entry['last_change_at']
+                previous = entry.get('change_interval') or observed
+                entry['change_interval'] = (
+                    CHANGE_RATE_ALPHA * observed + (1 - CHANGE_RATE_ALPHA) * previous
+                )
+            entry['last_change_at'] = now
+            interval = (entry['change_interval'] or DEFAULT_INTERVAL * 2) / 2
+        else:
+            entry['failures'] = 0
+            interval = entry['interval'] * STALE_BACKOFF
+
+        entry['interval'] = clamp(interval)
+        entry['next_due'] = now + entry['interval']
+        self.state.save_schedule(entry)
+        return entry
+
+    def next_due_time(self, feeds: list[dict]) -> float | None:
+        """Earliest due time among the given feeds."""
+        heap = self.due_queue(feeds)
+        return heap[0][0] if heap else None
@@ -0,0 +1,174 @@
+import json
+import re
+from datetime import datetime
+from urllib.parse import quote
+from xml.sax.saxutils import quoteattr
+
+# Formats write_feed can produce and the Content-Type each is served with
+CONTENT_TYPES = {
+    'rss': 'application/rss+xml; charset=utf-8',
+    'atom': 'application/atom+xml; charset=utf-8',
+    'json': 'application/feed+json; charset=utf-8',
+}
+
+# Characters iri_to_uri leaves alone; the rest is percent-encoded
+_URI_SAFE = "/#%[]=:;$&()+,!?*@'~"
+_URI_CLEAN = re.compile(r"[A-Za-z0-9_.\-/#%\[\]=:;$&()+,!?*@'~]*")
+
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def escape(text: str) -> str:
+    """Escape character data (&, < and >), as feedgenerator does."""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def iri_to_uri(iri: str) -> str:
+    """Percent-encode what can't appear in a URI, as feedgenerator does with links."""
+    if _URI_CLEAN.fullmatch(iri):
+        return iri
+    return quote(iri.encode('utf-8'), safe=_URI_SAFE)
+
+
+def _offset_minutes(date: datetime) -> int | None:
+    offset = date.utcoffset()
+    if offset is None:
+        return None
+    return offset.days * 24 * 60 + offset.seconds // 60
+
+
+def rfc2822_date(date: datetime) -> str:
+    """RSS date; naive datetimes are written with the unknown zone -0000."""
+    text = (f"{_DAYS[date.weekday()]}, {date.day:02d} {_MONTHS[date.month - 1]} {date.year:04d} "
+            f"{date.hour:02d}:{date.minute:02d}:{date.second:02d} ")
+    minutes = _offset_minutes(date)
+    if minutes is None:
+        return text + '-0000'
+    hours, minutes = divmod(minutes, 60)
+    return text + '%+03d%02d' % (hours, minutes)
+
+
+def rfc3339_date(date: datetime) -> str:
+    """Atom and JSON Feed date; naive datetimes are taken as UTC."""
+    text = (f"{date.year:04d}-{date.month:02d}-{date.day:02d}"
+            f"T{date.hour:02d}:{date.minute:02d}:{date.second:02d}")
+    minutes = _offset_minutes(date)
+    if minutes is None:
+        return text + 'Z'
+    hours, minutes = divmod(minutes, 60)
+    return text + '%+03d:%02d' % (hours, minutes)
+
+
+def _updated(items: list[dict]) -> datetime:
+    return max((item['pubdate'] for item in items), default=None) or datetime.now()
+
+
+def _write_rss(write, channel: dict, items: list[dict]):
+    link = iri_to_uri(channel['link'])
+    write(
+        '<?xml version="1.0" encoding="utf-8"?>\n<rss version="2.0"><channel>'
+        f"<title>{escape(channel['title'])}</title>"
+        f"<link>{escape(link)}</link>"
+        f"<description>{escape(channel['description'])}</description>"
+        f"<language>{escape(channel['language'])}</language>"
+        f"<lastBuildDate>{rfc2822_date(_updated(items))}</lastBuildDate>"
+    )
+    for item in items:
+        write(
+            f"<item><title>{escape(item['title'])}</title>"
+            f"<link>{escape(iri_to_uri(item['link']))}</link>"
+            f"<description>{escape(item['description'])}</description>"
+            f"<pubDate>{rfc2822_date(item['pubdate'])}</pubDate>"
+            f"<guid isPermaLink=\"false\">{escape(item['guid'])}</guid></item>"
+        )
+    write('</channel></rss>')
+
+
+def _write_atom(write, channel: dict, items: list[dict]):
+    link = iri_to_uri(channel['link'])
+    write(
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        f"<feed xml:lang={quoteattr(channel['language'])} xmlns=\"http://www.w3.org/2005/Atom\">"
+        f"<title>{escape(channel['title'])}</title>"
+        f"<link href={quoteattr(link)} rel=\"alternate\"></link>"
+        f"<id>{escape(channel['link'])}</id>"
+        f"<updated>{rfc3339_date(_updated(items))}</updated>"
+        f"<subtitle>{escape(channel['description'])}</subtitle>"
+    )
+    for item in items:
+        date = rfc3339_date(item['pubdate'])
+        write(
+            f"<entry><title>{escape(item['title'])}</title>"
+            f"<link href={quoteattr(iri_to_uri(item['link']))} rel=\"alternate\"></link>"
+            f"<published>{date}</published><updated>{date}</updated>"
+            f"<id>{escape(item['guid'])}</id>"
+            f"<summary type=\"html\">{escape(item['description'])}</summary></entry>"
+        )
+    write('</feed>')
+
+
+def _write_json(write, channel: dict, items: list[dict]):
+    header = json.dumps({
+        'version': 'https://jsonfeed.org/version/1.1',
+        'title': channel['title'],
+        'home_page_url': iri_to_uri(channel['link']),
+        'description': channel['description'],
+        'language': channel['language'],
+    }, ensure_ascii=False)
+    write(header[:-1] + ', "items": [')
+    for index, item in enumerate(items):
+        write(('' if index == 0 else ', ') + json.dumps({
+            'id': item['guid'],
+            'url': iri_to_uri(item['link']),
+            'title': item['title'],
+            'content_text': item['description'],
+            'date_published': rfc3339_date(item['pubdate']),
+        }, ensure_ascii=False))
+    write(']}')
+
+
+_WRITERS = {'rss': _write_rss, 'atom': _write_atom, 'json': _write_json}
+
+
+def write_feed(sink, channel: dict, items: list[dict], format: str = 'rss'):
+    """Write a feed to ``sink`` (anything with ``write(bytes)``) one item at a time.
+
+    ``channel`` holds the feed's title, link, description and language;
+    every item a title, link, description, guid and pubdate. The RSS and
+    Atom output is byte for byte what feedgenerator writes for the same
+    feed, and no string of the whole document is ever built.
+    """
+    try:
+        writer = _WRITERS[format]
+    except KeyError:
+        raise ValueError(f"Unknown feed format: {format}")
+    writer(lambda text: sink.write(text.encode('utf-8')), channel, items)
+
+
+class _Buffer:
+    """Collects written chunks; joining once at the end avoids BytesIO's regrowth."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(data)
+        return len(data)
+
+    def getvalue(self) -> bytes:
+        return b''.join(self.chunks)
+
+
+def render_feed(channel: dict, items: list[dict], format: str = 'rss') -> bytes:
+    """Serialize a feed to bytes."""
+    body = _Buffer()
+    write_feed(body, channel, items, format)
+    return body.getvalue()
+
+
+def count_items(body: bytes, format: str = 'rss') -> int:
+    """Number of items in a feed render_feed wrote."""
+    if format == 'json':
+        return len(json.loads(body)['items'])
+    return body.count(b'<entry>' if format == 'atom' else b'<item>')
@@ -0,0 +1,116 @@
+import threading
+
+from supabase_client import get_supabase, supabase_url as configured_supabase_url
+
+BUCKET = 'rss-feed-storage'
+RSS_CONTENT_TYPE = 'application/rss+xml; charset=utf-8'
+
+
+def feed_filename(feed_id) -> str:
+    """Storage filename for a feed whose row doesn't point at a stored file yet."""
+    return f"feed_{feed_id}.xml"
+
+
+def public_url(supabase_url: str, filename: str, bucket: str = BUCKET) -> str:
+    """Public URL of a stored file, built locally the same way storage3 does."""
+    return f"{supabase_url.rstrip('/')}/storage/v1/object/public/{bucket}/{filename}?"
+
+
+def filename_from_url(url: str, bucket: str = BUCKET) -> str | None:
+    """Storage filename of a public URL made by public_url (None for other URLs)."""
+    marker = f"/storage/v1/object/public/{bucket}/"
+    if not url or marker not in url:
+        return None
+    return url.split(marker, 1)[1].split('?', 1)[0] or None
+
+
+def same_url(a: str | None, b: str | None) -> bool:
+    """Compare storage URLs, ignoring the empty query string some SDKs append."""
+    return (a or '').rstrip('?') == (b or '').rstrip('?')
+
+
+class FeedWriter:
+    """Writes feed files and collects the rss_file_url changes of one run.
+
+    ``round_trips`` counts every request made to Supabase since the last
+    start_run() so a refresh run can report how many it needed. Without
+    an explicit ``client`` the shared one from get_supabase() is created
+    on first use.
+    """
+
+    def __init__(self, client=None, supabase_url: str | None = None, bucket: str = BUCKET):
+        self._client = client
+        self.supabase_url = supabase_url or configured_supabase_url()
+        self.bucket = bucket
+        self.round_trips = 0
+        self._pending = {}
+        self._claimed = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_supabase()
+        return self._client
+
+    def start_run(self):
+        """Reset the round trip count; staged changes are kept until flushed."""
+        with self._lock:
+            self.round_trips = 0
+            self._claimed = {}
+
+    def filename_for(self, feed: dict) -> str:
+        """File a feed is uploaded over: the one its rss_file_url names, so the
+        public URL subscribers use never changes.
+
+        Feeds without a stored file, and every feed but the first of a run
+        to claim a file it shares with others (rows written before files
+        were per feed), get feed_<id>.xml instead.
+        """
+        filename = filename_from_url(feed.get('rss_file_url'), self.bucket)
+        with self._lock:
+            if filename and self._claimed.setdefault(filename, feed['id']) == feed['id']:
+                return filename
+        return feed_filename(feed['id'])
+
+    def _count(self):
+        with self._lock:
+            self.round_trips += 1
+
+    def upload(self, filename: str, data: bytes) -> str:
+        """Upload (or overwrite) a feed file and return its public URL."""
+        self._count()
+        self.client.storage.from_(self.bucket).upload(
+            filename,
+            data,
+            {'content-type': RSS_CONTENT_TYPE, 'x-upsert': 'true'}
+        )
+        return self.url_for(filename)
+
+    def url_for(self, filename: str) -> str:
+        """Public URL of a feed file, without a request."""
+        return public_url(self.supabase_url, filename, self.bucket)
+
+    def stage(self, feed: dict, rss_file_url: str) -> bool:
+        """Queue a feed's new file URL; returns False if it didn't change."""
+        if same_url(feed.get('rss_file_url'), rss_file_url):
+            return False
+        with self._lock:
+            self._pending[feed['id']] = rss_file_url
+        return True
+
+    def flush(self) -> int:
+        """Write the staged file URLs and return how many rows were written.
+
+        Each row is updated on its own: an update can't bring back a feed
+        deleted during the run or touch columns edited meanwhile, as an
+        upsert of the rows read at the start would. Changes are rare, so
+        most runs make no request here at all.
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+        for feed_id, rss_file_url in pending.items():
+            self._count()
+            self.client.table('rss_feeds').update({'rss_file_url': rss_file_url}).eq('id', feed_id).execute()
+        return len(pending)
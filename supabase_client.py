@@ -0,0 +1,28 @@
+import os
+import threading
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def supabase_url() -> str | None:
+    return os.getenv("SUPABASE_URL")
+
+
+def get_supabase():
+    """Return the process-wide Supabase client, creating it on first use.
+
+    The supabase package is only imported here: it pulls in httpx,
+    postgrest and friends, which is most of the app's import time.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            url = supabase_url()
+            key = os.getenv("SUPABASE_SERVICE_KEY")
+            if not url or not key:
+                raise ValueError("Missing required environment variables SUPABASE_URL and/or SUPABASE_SERVICE_KEY")
+
+            from supabase import create_client
+            _client = create_client(url, key)
+        return _client
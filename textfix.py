@@ -0,0 +1,76 @@
+import os
+import re
+import time
+from functools import lru_cache
+
+from metrics import metrics
+
+# Number of distinct strings whose fixed form is remembered, and the
+# longest string worth remembering (bounds the cache's memory)
+TEXT_CACHE_SIZE = int(os.getenv("TEXT_CACHE_SIZE", 8192))
+MAX_CACHED_LENGTH = int(os.getenv("TEXT_MAX_CACHED_LENGTH", 2048))
+
+# The only ASCII characters ftfy.fix_text can change: '&' starts HTML
+# entities, '\r' is normalized to '\n' and control characters (terminal
+# escapes included) are removed. Everything else that ftfy fixes, from
+# mojibake to curly quotes and ligatures, needs a non-ASCII character.
+ASCII_NEEDS_FIXING = re.compile(r'[&\r\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+
+
+def needs_fixing(text: str) -> bool:
+    """False when ftfy.fix_text would return ``text`` unchanged for sure."""
+    return not text.isascii() or ASCII_NEEDS_FIXING.search(text) is not None
+
+
+def _ftfy(text: str) -> str:
+    import ftfy  # Loaded on first use, it is slow to import
+    started = time.perf_counter()
+    try:
+        return ftfy.fix_text(text)
+    finally:
+        metrics.inc('ftfy_seconds_total', time.perf_counter() - started)
+        metrics.inc('ftfy_calls_total')
+
+
+# Boilerplate ("Read more", bylines, repeated summaries) recurs across the
+# items of a page and across refreshes of the same feed
+_cached_ftfy = lru_cache(maxsize=TEXT_CACHE_SIZE)(_ftfy)
+
+
+def _fix(text: str) -> str:
+    if not needs_fixing(text):
+        return text
+    if len(text) > MAX_CACHED_LENGTH:
+        return _ftfy(text)
+    return _cached_ftfy(text)
+
+
+def fix_text(text: str) -> str:
+    """ftfy.fix_text, skipping clean ASCII and remembering recent results."""
+    metrics.inc('text_fix_strings_total')
+    return _fix(text)
+
+
+def fix_texts(texts: list[str]) -> list[str]:
+    """fix_text for all strings of a page at once.
+
+    Repeated strings within the batch are fixed once, and the counters
+    are updated once per batch rather than per string.
+    """
+    fixed = {}
+    for text in texts:
+        if text not in fixed:
+            fixed[text] = _fix(text)
+    metrics.inc('text_fix_strings_total', len(texts))
+    return [fixed[text] for text in texts]
+
+
+def cache_info():
+    return _cached_ftfy.cache_info()
+
+
+metrics.register_collector(lambda: [
+    (f"text_fix_cache_{field}", {}, value)
+    for field, value in cache_info()._asdict().items()
+    if value is not None
+])
@@ -1,15 +1,35 @@
 from lxml import html, etree
-from cssselect import GenericTranslator
 from datetime import datetime
-from urllib.parse import urlparse
-import requests
-import feedgenerator
-import ftfy
+from urllib.parse import urlparse, urljoin
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+import hashlib
+import json
+import os
+from fetcher import fetch, iter_body
+from metrics import metrics
+from textfix import fix_text, fix_texts
+from serializer import render_feed
+
+# Streaming limits for source pages; 0 disables a limit
+MAX_FEED_ITEMS = int(os.getenv("FEED_MAX_ITEMS", 50)) or None
+MAX_PAGE_BYTES = int(os.getenv("MAX_PAGE_BYTES", 20 * 1024 * 1024)) or None
+STREAM_CHUNK_SIZE = 64 * 1024
+# Most pages a paginated feed reads per refresh, and how many of them are
+# fetched at once when their URLs come from a template
+MAX_FEED_PAGES = int(os.getenv("FEED_MAX_PAGES", 10))
+PAGE_FETCH_CONCURRENCY = int(os.getenv("FEED_PAGE_CONCURRENCY", 4))
+
+@lru_cache(maxsize=512)
+def compile_xpath(selector: str) -> etree.XPath:
+    """Compile an XPath selector once; shared by the web app and the worker."""
+    return etree.XPath(selector)
 
 def validate_xpath_selector(selector: str) -> tuple[bool, str | None]:
     """Validate an XPath selector."""
     try:
-        etree.XPath(selector)
+        compile_xpath(selector)
         return True, None
     except etree.XPathSyntaxError as e:
         return False, str(e)
@@ -34,63 +54,542 @@ def make_absolute_url(relative_url: str, base_url: str) -> str:
         
     return f"{base_url.rstrip('/')}/{relative_url.lstrip('/')}"
 
-def find_description(title_element, description_xpath: str, tree, index: int) -> str:
-    """Find description text using various fallback methods."""
+def evaluate_descriptions(description_xpath: str, tree):
+    """Evaluate the description selector once for the whole document.
+
+    Returns the matches, or the exception raised so callers can report it
+    per item the same way find_description always has.
+    """
+    try:
+        return compile_xpath(description_xpath)(tree)
+    except Exception as e:
+        return e
+
+def find_description(title_element, description_xpath: str, tree, index: int,
+                     all_descriptions=None, fix=True) -> str:
+    """Find description text using various fallback methods.
+
+    Pass ``all_descriptions`` from evaluate_descriptions() to avoid
+    re-evaluating the selector over the whole document for every item,
+    and ``fix=False`` to get the raw text for fixing in a batch later.
+    """
+    clean = fix_text if fix else str
     try:
-        all_descriptions = tree.xpath(description_xpath)
+        if all_descriptions is None:
+            all_descriptions = evaluate_descriptions(description_xpath, tree)
+        if isinstance(all_descriptions, Exception):
+            raise all_descriptions
         if index < len(all_descriptions):
             text = all_descriptions[index].text_content().strip()
-            return ftfy.fix_text(text)
+            return clean(text)
         
         if description_xpath.startswith('//'):
-            relative_xpath = '.' + description_xpath
-            desc_elements = title_element.xpath(relative_xpath)
+            relative_xpath = compile_xpath('.' + description_xpath)
+            desc_elements = relative_xpath(title_element)
             if desc_elements:
-                return ftfy.fix_text(desc_elements[0].text_content().strip())
+                return clean(desc_elements[0].text_content().strip())
             
-        following_xpath = f"following::{description_xpath[2:]}"
-        desc_elements = title_element.xpath(following_xpath)
+        following_xpath = compile_xpath(f"following::{description_xpath[2:]}")
+        desc_elements = following_xpath(title_element)
         if desc_elements:
-            return ftfy.fix_text(desc_elements[0].text_content().strip())
+            return clean(desc_elements[0].text_content().strip())
             
     except Exception as e:
         print(f"Error finding description: {e}")
     
     return 'No description available'
 
-def create_rss_feed(url: str, title_xpath: str, description_xpath: str) -> str:
-    """Generate RSS feed from webpage using XPath selectors."""
-    try:
-        response = requests.get(url)
-        response.encoding = 'utf-8'
-        tree = html.fromstring(response.content)
-        tree.make_links_absolute(url)
+def conditional_headers(fetch_meta: dict | None, selectors: str) -> dict:
+    """Build If-None-Match/If-Modified-Since headers from stored fetch metadata.
+
+    Validators are only reused when the stored entry was produced with the
+    same selectors, otherwise an unchanged page would hide a selector edit.
+    """
+    headers = {}
+    if not fetch_meta or fetch_meta.get('selectors') != selectors:
+        return headers
+    if fetch_meta.get('etag'):
+        headers['If-None-Match'] = fetch_meta['etag']
+    if fetch_meta.get('last_modified'):
+        headers['If-Modified-Since'] = fetch_meta['last_modified']
+    return headers
+
+def content_digest(selectors: str):
+    """Start a hash of a page body keyed by the selectors used to extract it."""
+    digest = hashlib.sha256(selectors.encode('utf-8'))
+    digest.update(b'\0')
+    return digest
+
+def document_base_url(tree, url: str) -> str:
+    """Return the URL relative links resolve against (honours <base href>)."""
+    base_hrefs = tree.xpath('//base/@href')
+    if base_hrefs and base_hrefs[0].strip():
+        return urljoin(url, base_hrefs[0].strip())
+    return url
+
+def absolute_link(link: str, base_url: str) -> str:
+    """Resolve a link the way lxml's make_links_absolute would."""
+    return urljoin(base_url, link.strip())
+
+def parse_html_stream(chunks, max_bytes: int | None = None, stop_when=None, on_chunk=None):
+    """Incrementally parse HTML from an iterable of byte chunks.
+
+    Reading stops after ``max_bytes`` or as soon as ``stop_when(root)``
+    returns True for the partially built tree, which is checked at
+    doubling byte offsets so the checks cost O(page) overall. Every chunk
+    actually consumed is passed to ``on_chunk``. Returns the root element.
+    """
+    parser = etree.HTMLPullParser(events=('start',), tag='html')
+    parser.set_element_class_lookup(html.HtmlElementClassLookup())
+    root = None
+    received = 0
+    next_check = STREAM_CHUNK_SIZE
+
+    for chunk in chunks:
+        if max_bytes is not None:
+            chunk = chunk[:max_bytes - received]
+        if not chunk:
+            break
+        received += len(chunk)
+        if on_chunk:
+            on_chunk(chunk)
+        parser.feed(chunk)
+
+        if root is None:
+            for _, element in parser.read_events():
+                root = element
+        if max_bytes is not None and received >= max_bytes:
+            break
+        if stop_when and root is not None and received >= next_check:
+            next_check *= 2
+            if stop_when(root):
+                break
+
+    closed = parser.close()
+    return closed if closed is not None else root
+
+def enough_items(title_xpath: str, description_xpath: str, max_items: int):
+    """Build a stop condition for parse_html_stream.
+
+    Parsing may stop once one title and one description *past* the limit
+    have started, so the items we keep are complete and descriptions
+    still align by index exactly as on the full page.
+    """
+    def stop_when(root) -> bool:
+        try:
+            return (len(compile_xpath(title_xpath)(root)) > max_items
+                    and len(compile_xpath(description_xpath)(root)) > max_items)
+        except Exception:
+            return False  # Bad selectors are reported when the feed is rendered
+    return stop_when
+
+def item_guid(link: str, title: str) -> str:
+    """Stable GUID for an item, derived from its link and title."""
+    return hashlib.sha1(f"{link}\n{title}".encode('utf-8')).hexdigest()
+
+def extract_items(tree, url: str, title_xpath: str, description_xpath: str,
+                  max_items: int | None = None) -> list[dict]:
+    """Extract title/link/description/guid for every item on a parsed page.
+
+    Links are made absolute only for the items we keep rather than for
+    every link in the document. Titles and descriptions are fixed with
+    one fix_texts() call for the whole page.
+    """
+    base_url = document_base_url(tree, url)
+    
+    title_elements = compile_xpath(title_xpath)(tree)
+    if max_items:
+        title_elements = title_elements[:max_items]
+    all_descriptions = evaluate_descriptions(description_xpath, tree)
+    
+    titles = []
+    links = []
+    descriptions = []
+    for i, title_element in enumerate(title_elements):
+        titles.append(title_element.text_content().strip())
+        link = extract_link(title_element)
         
-        feed = feedgenerator.Rss201rev2Feed(
-            title=f"Custom RSS - {url}",
-            link=url,
-            description=f"Custom RSS feed for {url}",
-            language="en"
-        )
+        if link:
+            link = make_absolute_url(absolute_link(link, base_url), url)
+        links.append(link)
         
-        title_elements = tree.xpath(title_xpath)
+        descriptions.append(find_description(
+            title_element, description_xpath, tree, i, all_descriptions, fix=False
+        ))
+    
+    fixed = fix_texts(titles + descriptions)
+    titles, descriptions = fixed[:len(titles)], fixed[len(titles):]
+    
+    items = []
+    for title, link, description in zip(titles, links, descriptions):
+        items.append({
+            'title': title or 'No title',
+            'link': link or url,
+            'description': description,
+            'guid': item_guid(link or url, title or 'No title')
+        })
         
-        for i, title_element in enumerate(title_elements):
-            title = ftfy.fix_text(title_element.text_content().strip())
-            link = extract_link(title_element)
-            
-            if link:
-                link = make_absolute_url(link, url)
-            
-            description = find_description(title_element, description_xpath, tree, i)
-            
-            feed.add_item(
-                title=title or 'No title',
-                link=link or url,
-                description=description,
-                pubdate=datetime.now()
-            )
-            
-        return feed.writeString('utf-8')
+    return items
+
+def build_feed(url: str, items: list[dict], format: str = 'rss') -> bytes:
+    """Serialize items (RSS unless ``format`` says otherwise); items without a ``pubdate`` are dated now."""
+    now = datetime.now()
+    channel = {
+        'title': f"Custom RSS - {url}",
+        'link': url,
+        'description': f"Custom RSS feed for {url}",
+        'language': "en"
+    }
+    items = [item if item.get('pubdate') else {**item, 'pubdate': now} for item in items]
+    return render_feed(channel, items, format)
+
+def is_feed_error(result) -> bool:
+    """True for the ``Error: ...`` strings create_rss_feed returns instead of a feed."""
+    return isinstance(result, str)
+
+def render_rss_feed(tree, url: str, title_xpath: str, description_xpath: str,
+                    max_items: int | None = None, merge_items=None, format: str = 'rss') -> bytes:
+    """Build the RSS XML (UTF-8 encoded) for a parsed page.
+
+    ``merge_items`` may replace the extracted items before serialization,
+    e.g. to keep first-seen dates and history from an item store.
+    ``format`` picks another of serializer.CONTENT_TYPES.
+    """
+    with metrics.span('extract'):
+        items = extract_items(tree, url, title_xpath, description_xpath, max_items)
+    if merge_items is not None:
+        items = merge_items(items)
+    with metrics.span('serialize'):
+        return build_feed(url, items, format)
+
+def create_rss_feed(url: str, title_xpath: str, description_xpath: str,
+                    fetch_meta: dict | None = None, max_items: int | None = MAX_FEED_ITEMS,
+                    max_bytes: int | None = MAX_PAGE_BYTES,
+                    content: bytes | None = None, merge_items=None,
+                    pagination: dict | None = None, seen_links=None) -> bytes | str | None:
+    """Generate RSS feed from webpage using XPath selectors.
+
+    Returns the feed as UTF-8 bytes, ready to upload or serve, or an
+    ``Error: ...`` string (see is_feed_error).
+
+    The page is streamed and parsed incrementally: reading stops after
+    ``max_bytes`` or once ``max_items`` items are available, so memory and
+    latency follow the number of items taken rather than the page size.
+
+    When ``fetch_meta`` is given the request is made conditional on the
+    stored ETag/Last-Modified. ``None`` is returned if the server answers
+    304 or the bytes we read hash the same as last time; otherwise
+    ``fetch_meta`` is updated in place with the new validators and hash.
+
+    Pass already fetched page bytes as ``content`` to skip the request
+    (``fetch_meta`` is ignored then). ``merge_items`` is passed on to
+    render_rss_feed. With a ``pagination`` spec the following pages are
+    read too (see create_paginated_feed).
+    """
+    if pagination:
+        return create_paginated_feed(url, title_xpath, description_xpath, pagination,
+                                     fetch_meta, max_items, max_bytes, merge_items, seen_links)
+    return create_rss_feeds(url, [{
+        'title_xpath': title_xpath,
+        'description_xpath': description_xpath,
+        'fetch_meta': fetch_meta,
+        'merge_items': merge_items
+    }], max_items, max_bytes, content)[0]
+
+class _FeedReader:
+    """Per-feed view of a page shared by several feeds (see create_rss_feeds).
+
+    Hashes the bytes the feed would have read on its own: chunks stop
+    counting once the feed's own stop condition is met, at the same
+    checkpoints a solo parse_html_stream would have stopped at.
+    """
+
+    def __init__(self, spec: dict, max_items: int | None):
+        self.spec = spec
+        self.selectors = f"{spec['title_xpath']}\n{spec['description_xpath']}"
+        self.stop_when = (enough_items(spec['title_xpath'], spec['description_xpath'], max_items)
+                          if max_items else None)
+        self.digest = content_digest(self.selectors)
+        self.done = False
+
+    def on_chunk(self, chunk: bytes):
+        if not self.done:
+            self.digest.update(chunk)
+
+    def check(self, root) -> bool:
+        if not self.done and self.stop_when is not None and self.stop_when(root):
+            self.done = True
+        return self.done
+
+def create_rss_feeds(url: str, specs: list[dict], max_items: int | None = MAX_FEED_ITEMS,
+                     max_bytes: int | None = MAX_PAGE_BYTES,
+                     content: bytes | None = None) -> list[bytes | str | None]:
+    """create_rss_feed for several selector sets on one page, fetched and parsed once.
+
+    Each spec holds ``title_xpath`` and ``description_xpath`` plus the
+    optional ``fetch_meta``, ``merge_items``, ``format`` (see
+    render_rss_feed) and ``url`` (the feed's own URL, for links and the
+    channel; defaults to ``url``). Returns one
+    result per spec, as create_rss_feed would have: the feed bytes, ``None`` if
+    unchanged, or an ``Error: ...`` string.
+
+    Reading stops once every feed has enough items. The request is only
+    conditional when all feeds stored the same validators; either way
+    each feed's hash covers exactly the bytes it would have read alone,
+    so grouping never makes an unchanged feed look changed.
+    """
+    readers = [_FeedReader(spec, max_items) for spec in specs]
+    stop_when = None
+    if all(reader.stop_when for reader in readers):
+        def stop_when(root) -> bool:
+            return all([reader.check(root) for reader in readers])
+
+    def render(reader, tree):
+        spec = reader.spec
+        try:
+            return render_rss_feed(tree, spec.get('url') or url, spec['title_xpath'],
+                                   spec['description_xpath'], max_items, spec.get('merge_items'),
+                                   spec.get('format', 'rss'))
+        except Exception as e:
+            metrics.inc('feed_errors_total')
+            return f"Error: {str(e)}"
+
+    try:
+        if content is not None:
+            with metrics.span('parse'):
+                tree = parse_html_stream([content], max_bytes=max_bytes, stop_when=stop_when)
+            return [render(reader, tree) for reader in readers]
+
+        headers = [conditional_headers(reader.spec.get('fetch_meta'), reader.selectors)
+                   for reader in readers]
+        conditional = all(headers) and all(h == headers[0] for h in headers)
+        with metrics.span('fetch'):
+            response = fetch(url, headers=headers[0] if conditional else {}, stream=True)
+
+        with response:
+            if conditional and response.status_code == 304:
+                metrics.inc('feeds_unchanged_total', len(readers), reason='not_modified')
+                return [None] * len(readers)
+
+            def on_chunk(chunk):
+                for reader in readers:
+                    reader.on_chunk(chunk)
+
+            # Download and parse overlap, so they are timed together
+            with metrics.span('parse'):
+                tree = parse_html_stream(
+                    iter_body(response, STREAM_CHUNK_SIZE),
+                    max_bytes=max_bytes,
+                    stop_when=stop_when,
+                    on_chunk=on_chunk
+                )
+    except Exception as e:
+        metrics.inc('feed_errors_total', len(readers))
+        return [f"Error: {str(e)}"] * len(readers)
+
+    results = []
+    for reader in readers:
+        fetch_meta = reader.spec.get('fetch_meta')
+        if fetch_meta is not None:
+            body_hash = reader.digest.hexdigest()
+            if (fetch_meta.get('selectors') == reader.selectors
+                    and fetch_meta.get('content_hash') == body_hash):
+                metrics.inc('feeds_unchanged_total', reason='same_hash')
+                results.append(None)
+                continue
+            fetch_meta.update({
+                'url': reader.spec.get('url') or url,
+                'selectors': reader.selectors,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'content_hash': body_hash
+            })
+        results.append(render(reader, tree))
+    return results
+
+def pagination_error(pagination) -> str | None:
+    """Why a pagination spec is unusable, or None.
+
+    A spec is ``{"next_xpath": ...}`` (the link to the next page) or
+    ``{"url_template": ...}`` (the URL of page n with ``{page}`` for n,
+    absolute or relative to the feed URL), plus an optional ``max_pages``.
+    """
+    if not isinstance(pagination, dict):
+        return 'Pagination must be an object'
+    next_xpath = pagination.get('next_xpath')
+    url_template = pagination.get('url_template')
+    if bool(next_xpath) == bool(url_template):
+        return 'Pagination needs either next_xpath or url_template'
+    if next_xpath:
+        is_valid, error = validate_xpath_selector(next_xpath)
+        if not is_valid:
+            return f'Invalid next page XPath: {error}'
+    if url_template and '{page}' not in url_template:
+        return 'url_template must contain {page}'
+    max_pages = pagination.get('max_pages', MAX_FEED_PAGES)
+    if isinstance(max_pages, bool) or not isinstance(max_pages, int) or not 1 <= max_pages <= MAX_FEED_PAGES:
+        return f'max_pages must be between 1 and {MAX_FEED_PAGES}'
+    return None
+
+def pagination_selectors(title_xpath: str, description_xpath: str, pagination: dict) -> str:
+    """Selector fingerprint of a paginated feed; a changed spec means a changed feed."""
+    return f"{title_xpath}\n{description_xpath}\n{json.dumps(pagination, sort_keys=True)}"
+
+def next_page_url(tree, page_url: str, next_xpath: str) -> str | None:
+    """Absolute URL of the first ``next_xpath`` match (an element's href or an attribute)."""
+    for match in compile_xpath(next_xpath)(tree):
+        href = match.get('href') if hasattr(match, 'get') else str(match)
+        if href and href.strip():
+            return absolute_link(href, document_base_url(tree, page_url))
+    return None
+
+def crawl_pages(url: str, title_xpath: str, description_xpath: str, pagination: dict,
+                max_items: int | None = MAX_FEED_ITEMS, max_bytes: int | None = MAX_PAGE_BYTES,
+                seen_links=None, throttle=None, known_hash: str | None = None
+                ) -> tuple[list[dict] | None, str]:
+    """Extract the items of a feed's page and of the pages after it.
+
+    Next-link pages are followed one at a time; template pages are
+    fetched up to PAGE_FETCH_CONCURRENCY at a time over the shared
+    session and taken in page order. Items are deduplicated by link, the
+    first occurrence wins. Reading stops after ``max_pages``, at a page
+    with nothing new, at a later page that fails or answers an error, or
+    after the first page holding a link from ``seen_links`` (items an
+    earlier refresh found): older pages were read then.
+
+    The caller is expected to hold a slot of ``throttle`` (a
+    refresh.HostThrottle) for the first page; later pages wait out its
+    politeness delay, and template pages are only fetched in parallel
+    over slots of the host that are free.
+
+    Returns the items and a hash of the first page's bytes: where the
+    crawl stops depends on what earlier refreshes stored, and new items
+    show up on the first page. If that hash is ``known_hash`` no further
+    page is read and the items are None.
+    """
+    selectors = pagination_selectors(title_xpath, description_xpath, pagination)
+    max_pages = pagination.get('max_pages') or MAX_FEED_PAGES
+    stop_when = enough_items(title_xpath, description_xpath, max_items) if max_items else None
+    seen_links = seen_links or set()
+    items = []
+    keys = set()
+
+    def read(page_url, first=False):
+        """Parsed page and the hash of its bytes; None past the last page."""
+        page_digest = hashlib.sha256()
+        if throttle is not None and not first:
+            throttle.pace(page_url)
+        try:
+            with metrics.span('fetch'):
+                response = fetch(page_url, stream=True)
+            with response:
+                if response.status_code >= 400 and not first:
+                    return None
+                with metrics.span('parse'):
+                    tree = parse_html_stream(
+                        iter_body(response, STREAM_CHUNK_SIZE),
+                        max_bytes=max_bytes,
+                        stop_when=stop_when,
+                        on_chunk=page_digest.update
+                    )
+        except Exception as e:
+            if first:
+                raise
+            print(f"Stopped paginating at {page_url}: {str(e)}")
+            return None
+        return tree, page_digest.digest()
+
+    def take(page_url, page) -> bool:
+        """Add a page's new items; False once no further page should be read."""
+        if page is None or page[0] is None:
+            return False
+        metrics.inc('feed_pages_total')
+        with metrics.span('extract'):
+            page_items = extract_items(page[0], page_url, title_xpath, description_xpath, max_items)
+        added = 0
+        for item in page_items:
+            # Items without a link of their own all point at the page
+            key = item['guid'] if item['link'] == page_url else item['link']
+            if key not in keys:
+                keys.add(key)
+                items.append(item)
+                added += 1
+        return added > 0 and not any(item['link'] in seen_links for item in page_items)
+
+    page = read(url, first=True)
+    digest = content_digest(selectors)
+    digest.update(page[1])
+    first_hash = digest.hexdigest()
+    if known_hash is not None and first_hash == known_hash:
+        return None, first_hash
+    if not take(url, page) or max_pages == 1:
+        return items, first_hash
+
+    if pagination.get('next_xpath'):
+        # Each page names the next one, so these can only be read in turn
+        page_url = url
+        visited = {url}
+        for _ in range(max_pages - 1):
+            next_url = next_page_url(page[0], page_url, pagination['next_xpath'])
+            if next_url is None or next_url in visited:
+                break
+            visited.add(next_url)
+            page_url = next_url
+            page = read(page_url)
+            if not take(page_url, page):
+                break
+        return items, first_hash
+
+    page_urls = [urljoin(url, pagination['url_template'].format(page=number))
+                 for number in range(2, max_pages + 1)]
+    wanted = max(0, PAGE_FETCH_CONCURRENCY - 1)
+    extra = throttle.extra_slots(url, wanted) if throttle is not None else nullcontext(wanted)
+    with extra as taken:
+        # The slot held for the first page plus the ones free now
+        concurrency = 1 + taken
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for start in range(0, len(page_urls), concurrency):
+                batch = page_urls[start:start + concurrency]
+                # all() stops at the first page that ends the crawl
+                if not all(take(page_url, page) for page_url, page in zip(batch, executor.map(read, batch))):
+                    break
+    return items, first_hash
+
+def create_paginated_feed(url: str, title_xpath: str, description_xpath: str, pagination: dict,
+                          fetch_meta: dict | None = None, max_items: int | None = MAX_FEED_ITEMS,
+                          max_bytes: int | None = MAX_PAGE_BYTES, merge_items=None,
+                          seen_links=None, throttle=None, format: str = 'rss') -> bytes | str | None:
+    """create_rss_feed over a paginated listing (see crawl_pages), written as ``format``.
+
+    Requests are never conditional; ``None`` is returned, after reading
+    only the first page, when that page hashes the same as last time.
+    """
+    error = pagination_error(pagination)
+    if error:
+        metrics.inc('feed_errors_total')
+        return f"Error: {error}"
+    selectors = pagination_selectors(title_xpath, description_xpath, pagination)
+    try:
+        known_hash = None
+        if fetch_meta is not None and fetch_meta.get('selectors') == selectors:
+            known_hash = fetch_meta.get('content_hash')
+        items, body_hash = crawl_pages(url, title_xpath, description_xpath, pagination,
+                                       max_items, max_bytes, seen_links, throttle, known_hash)
+        if items is None:
+            metrics.inc('feeds_unchanged_total', reason='same_hash')
+            return None
+        if fetch_meta is not None:
+            fetch_meta.update({
+                'url': url,
+                'selectors': selectors,
+                'etag': None,
+                'last_modified': None,
+                'content_hash': body_hash
+            })
+        if merge_items is not None:
+            items = merge_items(items)
+        with metrics.span('serialize'):
+            return build_feed(url, items, format)
     except Exception as e:
-        return f"Error: {str(e)}" 
\ No newline at end of file
+        metrics.inc('feed_errors_total')
+        return f"Error: {str(e)}"
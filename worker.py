@@ -1,111 +1,457 @@
-from supabase import create_client
+import argparse
+import hashlib
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from dotenv import load_dotenv
 from datetime import datetime
-from urllib.parse import urlparse
-import requests
-from lxml import html, etree
-import feedgenerator
-from utils import create_rss_feed
+from utils import create_rss_feeds, create_paginated_feed, is_feed_error
+from refresh import refresh_batches, format_stats, shard_feeds, combine_stats, SourceGrouper, HostThrottle
+from feed_state import FeedState, STATE_PATH
+from fetcher import fetch_stats, get_session, DEFAULT_TIMEOUT
+from storage import FeedWriter, same_url
+from scheduler import FeedScheduler
+from metrics import metrics
+from supabase_client import get_supabase
+from catalog import iter_catalog, prefetch, CATALOG_PAGE_SIZE
+from host_health import host_health
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Supabase client
-supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
+# Uploads feed files and batches rss_feeds row changes per run (the
+# Supabase client is created on the first request)
+feed_writer = FeedWriter()
 
-if not supabase_url or not supabase_key:
-    raise ValueError("Missing required environment variables")
+# Local store of ETag/Last-Modified/content hash and schedule per feed
+feed_state = FeedState()
+scheduler = FeedScheduler(feed_state)
 
-supabase = create_client(supabase_url, supabase_key)
+# Concurrency settings for the refresh engine
+MAX_WORKERS = int(os.getenv("WORKER_MAX_WORKERS", 8))
+PER_HOST_LIMIT = int(os.getenv("WORKER_PER_HOST_LIMIT", 2))
+HOST_DELAY = float(os.getenv("WORKER_HOST_DELAY", 1.0))
+# Number of items each feed keeps across refreshes
+HISTORY_SIZE = int(os.getenv("FEED_HISTORY_SIZE", 100))
+# How often daemon mode reloads the feed catalog, in seconds
+CATALOG_INTERVAL = float(os.getenv("WORKER_CATALOG_INTERVAL", 15 * 60))
+# Circuit breaker state carried over between runs, next to the feed state
+HOST_HEALTH_PATH = os.getenv(
+    "HOST_HEALTH_PATH", os.path.join(os.path.dirname(STATE_PATH), "host_health.json")
+)
+# Default shard of this run, for runner jobs configured through env
+SHARD_INDEX = int(os.getenv("WORKER_SHARD_INDEX", 0))
+SHARD_COUNT = int(os.getenv("WORKER_SHARD_COUNT", 1))
+# Machine-readable summary of each run (stats plus stage timings)
+METRICS_PATH = os.getenv("WORKER_METRICS_PATH", "worker-metrics.json")
+# The web app's /feeds/invalidate endpoint and its token; the app serves
+# /feed/<id> from a cache that must drop feeds rewritten here
+FEED_INVALIDATE_URL = os.getenv("FEED_INVALIDATE_URL")
+FEED_INVALIDATE_TOKEN = os.getenv("FEED_INVALIDATE_TOKEN")
 
-def update_feed(feed_data):
-    """Update a single feed in storage."""
+# Feeds uploaded during the current run
+updated_ids = []
+
+# The slice of the catalog this process refreshes (see configure_shard)
+shard = {'index': 0, 'count': 1}
+
+def shard_path(path, shard_index, shard_count):
+    """Per-shard variant of a state or summary file path (unchanged with one shard)."""
+    if shard_count <= 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-shard{shard_index}of{shard_count}{ext}"
+
+def configure_shard(shard_index, shard_count):
+    """Make this process refresh one shard, with its own state and run summary.
+
+    Feeds are assigned to shards by a hash of their id, so every shard
+    only ever sees its own feeds and keeps their schedule, validators,
+    item history and host circuit states in files of its own. Changing
+    the shard count moves feeds to files without their state; they are
+    then simply refreshed unconditionally once.
+    """
+    global feed_state, scheduler
+    shard.update(index=shard_index, count=shard_count)
+    path = shard_path(STATE_PATH, shard_index, shard_count)
+    if path != feed_state.path:
+        feed_state.close()
+        feed_state = FeedState(path)
+        scheduler = FeedScheduler(feed_state)
+    host_health.load(shard_path(HOST_HEALTH_PATH, shard_index, shard_count))
+
+def publish_feed(feed_data, fetch_meta, rss_content, new_items=None):
+    """Upload a freshly rendered feed and record the refresh outcome.
+
+    The feed counts as changed for its schedule only when ``new_items``
+    (items first seen in this refresh; None when unknown) is non-zero:
+    pages whose bytes differ on every request (nonces, timestamps, ads)
+    would otherwise pull their schedule down to the minimum interval.
+    A feed rendering to the bytes uploaded last time isn't uploaded again.
+    """
     try:
-        print(f"Updating feed: {feed_data['url']}")
-        
-        # Generate new RSS content
-        rss_content = create_rss_feed(
-            feed_data['url'],
-            feed_data['title_xpath'],
-            feed_data['description_xpath']
-        )
-        
-        if rss_content.startswith('Error'):
+        if rss_content is None:
+            print(f"Feed unchanged, skipping upload: {feed_data['url']}")
+            scheduler.record(feed_data['id'], 'unchanged')
+            metrics.inc('feed_refreshes_total', outcome='unchanged')
+            return True
+            
+        if is_feed_error(rss_content):
             print(f"Error updating feed {feed_data['url']}: {rss_content}")
+            scheduler.record(feed_data['id'], 'error')
+            metrics.inc('feed_refreshes_total', outcome='error')
             return False
             
-        # Create a stable filename that includes both domain and path
-        parsed_url = urlparse(feed_data['url'])
-        domain = parsed_url.netloc
-        path = parsed_url.path.strip('/').replace('/', '_')
-        filename = f"{domain}_{path}.xml" if path else f"{domain}.xml"
+        # Upload over the feed's own file in one request (no remove first)
+        filename = feed_writer.filename_for(feed_data)
+        feed_hash = hashlib.sha256(rss_content).hexdigest()
+        if (fetch_meta.get('feed_hash') == feed_hash
+                and same_url(feed_data.get('rss_file_url'), feed_writer.url_for(filename))):
+            print(f"Feed output unchanged, skipping upload: {feed_data['url']}")
+            feed_state.save_fetch_meta(feed_data['id'], fetch_meta)
+            scheduler.record(feed_data['id'], 'unchanged')
+            metrics.inc('feed_refreshes_total', outcome='unchanged')
+            return True
+        fetch_meta['feed_hash'] = feed_hash
+        with metrics.span('supabase_upload'):
+            file_url = feed_writer.upload(filename, rss_content)
         
-        # If there's an existing file, delete it first
-        try:
-            supabase.storage \
-                .from_('rss-feed-storage') \
-                .remove([filename])
-        except:
-            pass  # Ignore if file doesn't exist
-            
-        # Upload new content
-        file_data = rss_content.encode('utf-8')
-        storage_response = supabase.storage \
-            .from_('rss-feed-storage') \
-            .upload(filename, file_data)
-            
-        # Get public URL (this should remain constant now)
-        file_url = supabase.storage \
-            .from_('rss-feed-storage') \
-            .get_public_url(filename)
-            
-        # Add debug logging for URL comparison
-        print(f"Current URL in database: {feed_data.get('rss_file_url')}")
-        print(f"New generated URL: {file_url}")
-
-        # Modify the database update to ensure it executes and check the response
-        update_response = supabase.table('rss_feeds') \
-            .update({'rss_file_url': file_url}) \
-            .eq('id', feed_data['id']) \
-            .execute()
-            
-        print(f"Database update response: {update_response}")
+        # The row is only rewritten, in the end-of-run batch, if its URL changed
+        if feed_writer.stage(feed_data, file_url):
+            print(f"Feed URL changed: {feed_data.get('rss_file_url')} -> {file_url}")
+        
+        # Only remember the new validators once the upload went through
+        feed_state.save_fetch_meta(feed_data['id'], fetch_meta)
         
+        scheduler.record(feed_data['id'], 'unchanged' if new_items == 0 else 'changed')
+        updated_ids.append(feed_data['id'])
+        metrics.inc('feed_refreshes_total', outcome='changed')
         print(f"Successfully updated feed: {feed_data['url']}")
         return True
         
     except Exception as e:
         print(f"Error updating feed {feed_data['url']}: {str(e)}")
+        scheduler.record(feed_data['id'], 'error')
+        metrics.inc('feed_refreshes_total', outcome='error')
         return False
 
-def main():
-    """Main function to update all feeds once."""
+def update_page_feeds(group, throttle=None):
+    """Update every feed reading one source page, fetching and parsing it once.
+
+    ``group`` is an entry of refresh.group_by_source(). Feeds with a
+    pagination spec crawl their own pages instead, stopping at the items
+    they already hold; their later pages go through ``throttle`` (the
+    refresh's refresh.HostThrottle). Returns whether each of its feeds
+    was refreshed successfully.
+    """
+    feeds = group['feeds']
+    fetch_metas = [{} for _ in feeds]
+    results = {}
+    # Items first seen in this refresh, per feed id (see publish_feed)
+    new_items = {}
+    
+    def merge_items(feed_id):
+        def merge(items):
+            now = time.time()
+            merged = feed_state.merge_items(feed_id, items, HISTORY_SIZE, now)
+            new_items[feed_id] = sum(1 for item in merged if item['first_seen'] == now)
+            return merged
+        return merge
+    
     try:
-        print(f"\nStarting feed updates at {datetime.now()}")
+        # Hosts that keep failing are skipped until their circuit half-opens
+        if not host_health.is_available(group['url']):
+            print(f"Host unavailable, skipping {len(feeds)} feeds of {group['url']}")
+            for feed_data in feeds:
+                scheduler.record(feed_data['id'], 'error')
+            metrics.inc('feed_refreshes_total', len(feeds), outcome='skipped')
+            return [False] * len(feeds)
         
-        # Get all feeds from database
-        response = supabase.table('rss_feeds').select('*').execute()
-        feeds = response.data
+        print(f"Updating {len(feeds)} feeds from: {group['url']}")
         
-        if not feeds:
-            print("No feeds found in database")
-            return
-            
-        print(f"Found {len(feeds)} feeds to update")
+        # Generate new RSS content, conditional on what we fetched last time
+        fetch_metas = [feed_state.get_fetch_meta(feed_data['id']) for feed_data in feeds]
+        specs = [
+            {
+                'url': feed_data['url'],
+                'title_xpath': feed_data['title_xpath'],
+                'description_xpath': feed_data['description_xpath'],
+                'fetch_meta': fetch_meta,
+                'merge_items': merge_items(feed_data['id'])
+            }
+            for feed_data, fetch_meta in zip(feeds, fetch_metas)
+        ]
+        single = [index for index, feed_data in enumerate(feeds) if not feed_data.get('pagination')]
+        if single:
+            results.update(zip(single, create_rss_feeds(group['url'], [specs[index] for index in single])))
+        for index, feed_data in enumerate(feeds):
+            if not feed_data.get('pagination'):
+                continue
+            spec = specs[index]
+            try:
+                results[index] = create_paginated_feed(
+                    spec['url'], spec['title_xpath'], spec['description_xpath'],
+                    feed_data['pagination'], spec['fetch_meta'],
+                    merge_items=spec['merge_items'],
+                    seen_links=feed_state.known_links(feed_data['id']),
+                    throttle=throttle
+                )
+            except Exception as e:
+                results[index] = f"Error: {str(e)}"
+    except Exception as e:
+        # Feeds already rendered keep their results
+        for index in range(len(feeds)):
+            results.setdefault(index, f"Error: {str(e)}")
+    
+    return [publish_feed(feed_data, fetch_meta, results[index], new_items.get(feed_data['id']))
+            for index, (feed_data, fetch_meta) in enumerate(zip(feeds, fetch_metas))]
+
+def update_feed(feed_data):
+    """Update a single feed in storage."""
+    return update_page_feeds({'url': feed_data['url'], 'feeds': [feed_data]})[0]
+
+def invalidate_served_feeds(feed_ids):
+    """Tell the web app to drop its cached copies of the given feeds."""
+    if not feed_ids or not FEED_INVALIDATE_URL or not FEED_INVALIDATE_TOKEN:
+        return
+    try:
+        response = get_session().post(
+            FEED_INVALIDATE_URL,
+            json={'ids': list(feed_ids)},
+            headers={'Authorization': f"Bearer {FEED_INVALIDATE_TOKEN}"},
+            timeout=DEFAULT_TIMEOUT
+        )
+        response.raise_for_status()
+        print(f"Invalidated {len(feed_ids)} served feeds")
+    except Exception as e:
+        # The app's cache TTL still bounds how stale a served feed gets
+        print(f"Feed cache invalidation failed: {str(e)}")
+
+def write_run_summary(stats, path=None):
+    """Write this run's refresh stats and metrics as JSON (one file per shard)."""
+    path = path or shard_path(METRICS_PATH, shard['index'], shard['count'])
+    summary = {
+        'finished_at': datetime.now().isoformat(),
+        'shard': dict(shard),
+        'stats': stats,
+        'round_trips': feed_writer.round_trips,
+        **metrics.summary()
+    }
+    try:
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"Run summary written to {path}")
+    except OSError as e:
+        print(f"Could not write run summary: {str(e)}")
+
+def load_feeds(page_size=CATALOG_PAGE_SIZE):
+    """Read the feed catalog page by page, the next page loading in the background."""
+    return prefetch(iter_catalog(get_supabase(), page_size))
+
+def refresh_feeds(pages, max_workers=MAX_WORKERS, per_host_limit=PER_HOST_LIMIT,
+                  host_delay=HOST_DELAY, force=False):
+    """Refresh the feeds that are due (or all of them with ``force``).
+
+    ``pages`` is an iterable of lists of feeds, such as load_feeds();
+    the due feeds of each page are queued as soon as it arrives.
+    """
+    now = time.time()
+    feed_writer.start_run()
+    schedules = None if force else feed_state.get_schedules()
+    # Feeds reading the same page share one fetch and one parse
+    grouper = SourceGrouper()
+    counts = {'feeds': 0, 'due': 0}
+    outcomes = []
+    # Shared with the paginated feeds' later pages
+    throttle = HostThrottle(per_host_limit, host_delay)
+    
+    def due_groups():
+        try:
+            for page in pages:
+                due = page if force else scheduler.due_feeds(page, now, schedules)
+                counts['feeds'] += len(page)
+                counts['due'] += len(due)
+                yield grouper.add(due)
+        except Exception as e:
+            # Still finish (and flush) what was already queued
+            print(f"Catalog read failed after {counts['feeds']} feeds: {str(e)}")
+            metrics.inc('catalog_errors_total')
+    
+    def update(group):
+        feeds = grouper.start(group)
+        with metrics.span('refresh'):
+            results = update_page_feeds({'url': group['url'], 'feeds': feeds}, throttle)
+        outcomes.extend(results)
+        return all(results)
+    
+    # Update pages concurrently, bounded globally and per host
+    stats = refresh_batches(
+        due_groups(),
+        update,
+        max_workers=max_workers,
+        per_host_limit=per_host_limit,
+        host_delay=host_delay,
+        throttle=throttle
+    )
+    print(f"{counts['due']} of {counts['feeds']} feeds were due for a refresh")
+    if not counts['due']:
+        return None
+    
+    stats['feeds'] = counts['due']
+    stats['feeds_successful'] = sum(outcomes)
+    stats['fetches_saved'] = counts['due'] - stats['total']
+    metrics.inc('shared_fetches_saved_total', stats['fetches_saved'])
+    
+    print(f"Successfully updated {stats['feeds_successful']} out of {counts['due']} feeds")
+    print(f"Fetched and parsed {stats['total']} pages for {counts['due']} feeds "
+          f"({stats['fetches_saved']} fetches and parses saved)")
+    print(format_stats(stats, unit='pages'))
+    
+    # Write the file URLs that changed, usually none
+    with metrics.span('supabase_flush'):
+        written = feed_writer.flush()
+    print(f"Updated {written} feed rows, {feed_writer.round_trips} Supabase round trips")
+    
+    invalidate_served_feeds(updated_ids)
+    updated_ids.clear()
+    
+    host_health.save(shard_path(HOST_HEALTH_PATH, shard['index'], shard['count']))
+    
+    pool = fetch_stats()
+    print(f"HTTP requests: {pool['requests']}, connections opened: "
+          f"{pool['connections_opened']}, reused: {pool['connections_reused']}")
+    
+    write_run_summary(stats)
+    return stats
+
+def run_shard(shard_index, shard_count, feeds=None, max_workers=MAX_WORKERS,
+              per_host_limit=PER_HOST_LIMIT, host_delay=HOST_DELAY, force=False):
+    """Refresh one shard's slice of the catalog in this process.
+
+    The catalog is streamed from the database unless a list of ``feeds``
+    is given.
+    """
+    configure_shard(shard_index, shard_count)
+    print(f"Shard {shard_index + 1}/{shard_count}")
+    pages = load_feeds() if feeds is None else [feeds]
+    pages = (shard_feeds(page, shard_index, shard_count) for page in pages)
+    return refresh_feeds(pages, max_workers, per_host_limit, host_delay, force)
+
+def refresh_in_processes(shard_indexes, shard_count, max_workers=MAX_WORKERS,
+                         per_host_limit=PER_HOST_LIMIT, host_delay=HOST_DELAY, force=False):
+    """Refresh several shards side by side, one process each.
+
+    Parsing, text fixing and serialization hold the GIL, so threads in a
+    single process top out at one core; each process here has its own
+    thread pool, HTTP connections, state file and run summary. Per-host
+    limits apply within each process. Each process streams the catalog
+    itself and keeps its own shard of every page.
+    """
+    # Spawned (not forked) children start without the parent's locks,
+    # sessions and SQLite connection
+    with ProcessPoolExecutor(max_workers=len(shard_indexes), mp_context=get_context('spawn')) as pool:
+        futures = [
+            pool.submit(run_shard, index, shard_count, None,
+                        max_workers, per_host_limit, host_delay, force)
+            for index in shard_indexes
+        ]
+        results = [future.result() for future in futures]
+    
+    ran = [stats for stats in results if stats]
+    if ran:
+        combined = combine_stats(ran)
+        feeds_total = sum(stats['feeds'] for stats in ran)
+        feeds_ok = sum(stats['feeds_successful'] for stats in ran)
+        print(f"\nAll shards: refreshed {feeds_total} feeds from {combined['total']} pages "
+              f"in {combined['elapsed']:.1f}s ({combined['throughput']:.2f} pages/s), "
+              f"{feeds_ok} ok / {feeds_total - feeds_ok} failed")
+    return results
+
+def main(max_workers=MAX_WORKERS, per_host_limit=PER_HOST_LIMIT, host_delay=HOST_DELAY,
+         force=False, shard_index=0, shard_count=1, processes=1):
+    """Main function to update all due feeds once.
+
+    With ``shard_count`` > 1 only shard ``shard_index`` of the catalog is
+    refreshed (one runner job per shard). ``processes`` > 1 splits that
+    shard further across local processes: shard i of n then runs the
+    shards i, i + n, i + 2n, ... of n * processes, which together hold
+    exactly the feeds of shard i of n.
+    """
+    try:
+        print(f"\nStarting feed updates at {datetime.now()}")
         
-        # Update each feed
-        successful_updates = 0
-        for feed in feeds:
-            if update_feed(feed):
-                successful_updates += 1
+        # The catalog is read page by page while the first pages refresh
+        if processes > 1:
+            shard_indexes = [shard_index + shard_count * k for k in range(processes)]
+            refresh_in_processes(shard_indexes, shard_count * processes,
+                                 max_workers, per_host_limit, host_delay, force)
+        else:
+            run_shard(shard_index, shard_count, None, max_workers, per_host_limit,
+                      host_delay, force)
                 
         print(f"\nUpdate completed at {datetime.now()}")
-        print(f"Successfully updated {successful_updates} out of {len(feeds)} feeds")
         
     except Exception as e:
         print(f"Error in main function: {str(e)}")
 
+def run_daemon(max_workers=MAX_WORKERS, per_host_limit=PER_HOST_LIMIT, host_delay=HOST_DELAY,
+               catalog_interval=CATALOG_INTERVAL, shard_index=0, shard_count=1):
+    """Keep running, refreshing each feed when it comes due.
+
+    The catalog is reloaded every ``catalog_interval`` seconds to pick up
+    new and deleted feeds; in between the process sleeps until the next
+    feed is due.
+    """
+    configure_shard(shard_index, shard_count)
+    feeds = []
+    loaded_at = 0.0
+    while True:
+        try:
+            if time.time() - loaded_at >= catalog_interval:
+                feeds = [feed for page in load_feeds()
+                         for feed in shard_feeds(page, shard_index, shard_count)]
+                loaded_at = time.time()
+                print(f"Loaded {len(feeds)} feeds at {datetime.now()}")
+            
+            refresh_feeds([feeds], max_workers, per_host_limit, host_delay)
+            
+            next_due = scheduler.next_due_time(feeds)
+            wake_at = min(next_due if next_due is not None else float('inf'),
+                          loaded_at + catalog_interval)
+        except Exception as e:
+            print(f"Error in daemon loop: {str(e)}")
+            wake_at = time.time() + 60
+        
+        time.sleep(max(1.0, wake_at - time.time()))
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Refresh the stored RSS feeds that are due.")
+    parser.add_argument('--max-workers', type=int, default=MAX_WORKERS,
+                        help="Maximum number of feeds refreshed at the same time")
+    parser.add_argument('--per-host-limit', type=int, default=PER_HOST_LIMIT,
+                        help="Maximum concurrent refreshes against a single host")
+    parser.add_argument('--host-delay', type=float, default=HOST_DELAY,
+                        help="Minimum seconds between request starts to the same host")
+    parser.add_argument('--all', action='store_true',
+                        help="Refresh every feed, ignoring the schedule")
+    parser.add_argument('--daemon', action='store_true',
+                        help="Keep running and refresh feeds as they come due")
+    parser.add_argument('--shard-index', type=int, default=SHARD_INDEX,
+                        help="Which shard of the catalog this run refreshes (0-based)")
+    parser.add_argument('--shard-count', type=int, default=SHARD_COUNT,
+                        help="Number of shards the catalog is split into by feed id")
+    parser.add_argument('--processes', type=int, default=1,
+                        help="Split this run's shard across this many local processes")
+    args = parser.parse_args()
+    if not 0 <= args.shard_index < args.shard_count:
+        parser.error("--shard-index must be between 0 and --shard-count - 1")
+    if args.daemon:
+        if args.processes > 1:
+            parser.error("--processes can't be combined with --daemon")
+        run_daemon(args.max_workers, args.per_host_limit, args.host_delay,
+                   shard_index=args.shard_index, shard_count=args.shard_count)
+    else:
+        main(args.max_workers, args.per_host_limit, args.host_delay, args.all,
+             args.shard_index, args.shard_count, max(1, args.processes))